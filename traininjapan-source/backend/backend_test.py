@@ -205,9 +205,9 @@ class APITester:
             if passed:
                 school = response.json()
                 print(f"   Created school: {school.get('name')}")
-                # Update school token since user role changed
+                # Update school token since user role changed (a fresh token is issued with the new role)
                 self.school_user_id = self.student_user_id
-                self.school_token = self.student_token
+                self.school_token = response.cookies.get('session_token', self.student_token)
         except Exception as e:
             self.log_result("POST /api/schools", False, message=str(e))
 
@@ -686,6 +686,11 @@ class APITester:
                                     print(f"✓ Updated role via pymongo: {user_id}")
                                 except Exception as e:
                                     print(f"✗ Pymongo update failed: {str(e)}")
+                            
+                            # Log in again so the session token carries the admin role claim
+                            login_response = requests.post(f"{API}/auth/login", json={"email": admin_email, "password": admin_password}, timeout=10)
+                            if login_response.status_code == 200 and 'session_token' in login_response.cookies:
+                                self.admin_token = login_response.cookies['session_token']
         except Exception as e:
             print(f"✗ Failed to create admin user: {str(e)}")
         
@@ -736,6 +741,18 @@ class APITester:
                 print(f"   Found {len(programs)} programs (all)")
         except Exception as e:
             self.log_result("GET /api/admin/programs", False, message=str(e))
+        
+        # Test GET /api/admin/cache-stats
+        try:
+            headers = {"Authorization": f"Bearer {self.admin_token}"}
+            response = requests.get(f"{API}/admin/cache-stats", headers=headers, timeout=10)
+            passed = response.status_code == 200 and "session_cache" in response.json()
+            self.log_result("GET /api/admin/cache-stats", passed, response.status_code, 200)
+            if passed:
+                session_stats = response.json()["session_cache"]
+                print(f"   Session cache: {session_stats.get('hits')} hits / {session_stats.get('misses')} misses, {session_stats.get('entries')} entries")
+        except Exception as e:
+            self.log_result("GET /api/admin/cache-stats", False, message=str(e))
 
     def test_programs_with_school_branding(self):
         """Test /api/programs endpoint with school branding data - NEW FEATURE"""
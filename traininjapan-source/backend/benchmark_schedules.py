@@ -0,0 +1,99 @@
+"""
+Microbenchmark for schedule session generation
+
+Compares the old create_course_schedule loop (walk every day between the
+start and end dates, build a CourseSession per occurrence) with
+build_session_docs for 1-, 12- and 60-month schedules. Only generation is
+timed; the database write is a single insert_many either way now (it used
+to be one awaited insert_one per session on top of these numbers).
+
+Usage:
+    python benchmark_schedules.py [--rounds 20]
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+# server.py reads these at import time; the Motor client does not connect until used
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+from server import CourseSession, build_session_docs  # noqa: E402
+
+COURSE = {"id": "course-1", "location_id": "location-1", "instructor_id": "instructor-1", "capacity": 12}
+
+SCHEDULES = {
+    "daily": {"recurrence_type": "daily", "recurrence_days": [], "recurrence_interval": 1},
+    "weekly Mon/Wed/Fri": {"recurrence_type": "weekly", "recurrence_days": [1, 3, 5], "recurrence_interval": 1},
+    "custom every 3 days": {"recurrence_type": "custom", "recurrence_days": [], "recurrence_interval": 3},
+    # Out-of-range weekdays never matched in the day walk and must not generate sessions
+    "weekly [0, 3, 8]": {"recurrence_type": "weekly", "recurrence_days": [0, 3, 8], "recurrence_interval": 1},
+}
+
+
+def day_walk(course, schedule):
+    """The previous implementation, minus the per-session insert_one"""
+    start_date = date.fromisoformat(schedule["start_date"])
+    end_date = date.fromisoformat(schedule["end_date"])
+    sessions = []
+    current_date = start_date
+    while current_date <= end_date:
+        if schedule["recurrence_type"] == "once":
+            should_create_session = current_date == start_date
+        elif schedule["recurrence_type"] == "daily":
+            should_create_session = True
+        elif schedule["recurrence_type"] == "weekly":
+            should_create_session = current_date.isoweekday() in schedule["recurrence_days"]
+        else:
+            should_create_session = (current_date - start_date).days % schedule["recurrence_interval"] == 0
+        if should_create_session:
+            sessions.append(CourseSession(
+                course_id=course["id"],
+                schedule_id=schedule["id"],
+                date=current_date.isoformat(),
+                start_time=schedule["start_time"],
+                end_time=schedule["end_time"],
+                location_id=course["location_id"],
+                instructor_id=course["instructor_id"],
+                max_capacity=course["capacity"]
+            ).model_dump())
+        current_date += timedelta(days=1)
+    return sessions
+
+
+def time_it(fn, schedule, rounds: int) -> float:
+    fn(COURSE, schedule)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(COURSE, schedule)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    start = date(2027, 1, 1)
+    print(f"{'schedule':<22}{'months':>7}{'sessions':>10}{'day walk':>12}{'expanded':>12}{'speedup':>9}")
+    for name, recurrence in SCHEDULES.items():
+        for months in (1, 12, 60):
+            schedule = {
+                "id": "schedule-1",
+                "start_date": start.isoformat(),
+                "end_date": (start + timedelta(days=round(months * 30.44) - 1)).isoformat(),
+                "start_time": "09:00",
+                "end_time": "12:00",
+                **recurrence
+            }
+            expected = [session["date"] for session in day_walk(COURSE, schedule)]
+            assert [session["date"] for session in build_session_docs(COURSE, schedule)] == expected, name
+
+            old = time_it(day_walk, schedule, args.rounds)
+            new = time_it(build_session_docs, schedule, args.rounds)
+            print(f"{name:<22}{months:>7}{len(expected):>10}{old * 1000:>10.2f}ms{new * 1000:>10.2f}ms{old / new:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
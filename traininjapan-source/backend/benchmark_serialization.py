@@ -0,0 +1,87 @@
+"""
+Microbenchmark for list-response serialization
+
+Compares the default FastAPI path for a page of courses (build a Course model
+per document, run jsonable_encoder over the list, json.dumps it) with the
+ModelJSONSerializer path used by the list endpoints. No database is needed;
+the documents are synthetic but shaped like real course documents.
+
+Usage:
+    python benchmark_serialization.py [--docs 1000] [--rounds 50]
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+# server.py reads these at import time; the Motor client does not connect until used
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmark')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from server import Course, COURSE_JSON  # noqa: E402
+
+
+def make_docs(count: int):
+    now = datetime.now(timezone.utc)
+    return [{
+        "id": str(uuid.uuid4()),
+        "school_id": str(uuid.uuid4()),
+        "location_id": str(uuid.uuid4()),
+        "instructor_id": str(uuid.uuid4()),
+        "title": f"Intensive Kenjutsu Program {i}",
+        "description": "Two weeks of daily training in classical swordsmanship. " * 4,
+        "martial_arts_style": "Kenjutsu",
+        "course_category": "Martial Arts",
+        "category": "Kenjutsu",
+        "experience_level": "Intermediate",
+        "class_type": "Group",
+        "price": 1450.0,
+        "currency": "AUD",
+        "duration": "14 days",
+        "capacity": 12,
+        "start_date": "2027-04-01",
+        "end_date": "2027-04-14",
+        "image_url": "https://example.com/course.jpg",
+        "status": "approved",
+        "created_at": now,
+    } for i in range(count)]
+
+
+def default_path(docs):
+    return json.dumps(jsonable_encoder([Course(**doc) for doc in docs])).encode()
+
+
+def fast_path(docs):
+    return COURSE_JSON.dump_list(docs)
+
+
+def time_it(fn, docs, rounds: int) -> float:
+    fn(docs)  # warm-up
+    start = time.process_time()
+    for _ in range(rounds):
+        fn(docs)
+    return (time.process_time() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    docs = make_docs(args.docs)
+    assert json.loads(default_path(docs)) == json.loads(fast_path(docs)), "serializers disagree"
+
+    baseline = time_it(default_path, docs, args.rounds)
+    fast = time_it(fast_path, docs, args.rounds)
+    print(f"{args.docs} courses, {args.rounds} rounds (CPU time per request)")
+    print(f"  pydantic + jsonable_encoder + json.dumps: {baseline * 1000:8.2f} ms")
+    print(f"  ModelJSONSerializer (orjson):             {fast * 1000:8.2f} ms")
+    print(f"  speedup: {baseline / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
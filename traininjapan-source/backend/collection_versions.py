@@ -0,0 +1,25 @@
+"""
+Write counters behind catalog ETags and cache validation
+
+server.py answers conditional requests (ETag / If-None-Match) and validates
+its catalog caches against per-collection counters in the collection_versions
+collection. A write that does not bump them is invisible to clients and
+workers until the counter moves for some other reason - so every writer,
+including the scripts in this directory, must bump the collections it
+changed:
+
+    await bump_collection_versions(db, "courses", "schools")
+"""
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+
+async def bump_collection_version(db, name: str) -> int:
+    doc = await db.collection_versions.find_one_and_update(
+        {"_id": name}, {"$inc": {"version": 1}, "$set": {"updated_at": datetime.now(timezone.utc)}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["version"]
+
+async def bump_collection_versions(db, *names: str):
+    for name in names:
+        await bump_collection_version(db, name)
@@ -60,8 +60,30 @@ async def create_indexes():
             else:
                 print(f"⚠ Warning: {e}")
     
+    # TTL indexes - expires_at is a native BSON date (see migrate_datetimes.py),
+    # so Mongo removes expired documents on its own
+    async def ensure_ttl_index(collection, field):
+        index_name = f"{field}_1"
+        existing = (await collection.index_information()).get(index_name)
+        if existing and "expireAfterSeconds" not in existing:
+            await collection.drop_index(index_name)
+            print(f"  Dropped non-TTL index {collection.name}.{index_name}")
+        try:
+            await collection.create_index(field, expireAfterSeconds=0)
+            print(f"✓ Created TTL index on {collection.name}.{field}")
+        except Exception as e:
+            print(f"⚠ Warning creating TTL index on {collection.name}.{field}: {e}")
+    
     await safe_create_index(db.user_sessions, "user_id")
-    await safe_create_index(db.user_sessions, "expires_at")
+    await ensure_ttl_index(db.user_sessions, "expires_at")
+    
+    # Session cache invalidation log (read by every worker's SessionCache.sync)
+    await safe_create_index(db.session_invalidations, "seq", unique=True)
+    await ensure_ttl_index(db.session_invalidations, "expire_at")
+    
+    # Revoked stateless JWTs (loaded periodically by TokenRevocationList)
+    await ensure_ttl_index(db.revoked_tokens, "expires_at")
+    await safe_create_index(db.revoked_tokens, "user_id")
     
     # Users
     await safe_create_index(db.users, "email", unique=True)
@@ -73,6 +95,8 @@ async def create_indexes():
     await safe_create_index(db.schools, "id", unique=True)
     await safe_create_index(db.schools, "owner_id")
     await safe_create_index(db.schools, "approved")
+    await safe_create_index(db.schools, [("created_at", 1), ("id", 1)], name="schools_page")
+    await safe_create_index(db.schools, [("approved", 1), ("created_at", 1), ("id", 1)], name="schools_approved_page")
     
     # Courses
     await safe_create_index(db.courses, "id", unique=True)
@@ -80,6 +104,10 @@ async def create_indexes():
     await safe_create_index(db.courses, "location_id")
     await safe_create_index(db.courses, "instructor_id")
     await safe_create_index(db.courses, "status")
+    await safe_create_index(db.courses, [("location_id", 1), ("status", 1), ("end_date", 1)], name="courses_location_occupancy")
+    await safe_create_index(db.courses, [("created_at", 1), ("id", 1)], name="courses_page")
+    await safe_create_index(db.courses, [("status", 1), ("created_at", 1), ("id", 1)], name="courses_status_page")
+    await safe_create_index(db.courses, [("school_id", 1), ("status", 1), ("created_at", 1), ("id", 1)], name="courses_school_page")
     
     # Bookings - critical for queries
     await safe_create_index(db.bookings, "id", unique=True)
@@ -87,10 +115,27 @@ async def create_indexes():
     await safe_create_index(db.bookings, "user_id")
     await safe_create_index(db.bookings, "payment_status")
     await safe_create_index(db.bookings, "status")
+    await safe_create_index(db.bookings, "booking_date")
+    
+    await safe_create_index(db.bookings, [("user_id", 1), ("booking_date", 1), ("id", 1)], name="bookings_user_page")
+    await safe_create_index(db.bookings, [("course_id", 1), ("booking_date", 1), ("id", 1)], name="bookings_course_page")
     
     # Compound index for common query pattern
     await safe_create_index(db.bookings, [("course_id", 1), ("user_id", 1), ("payment_status", 1)], name="booking_query_compound")
     
+    # Background jobs - workers claim the oldest due job, or a running one whose lease expired
+    await safe_create_index(db.jobs, "id", unique=True)
+    await safe_create_index(db.jobs, [("status", 1), ("run_at", 1)], name="jobs_due")
+    await safe_create_index(db.jobs, [("status", 1), ("lease_expires_at", 1)], name="jobs_lease")
+    await safe_create_index(db.jobs, [("status", 1), ("dead_at", -1)], name="jobs_dead")
+    try:
+        await db.jobs.create_index("dedupe_key", unique=True, sparse=True)
+        print("✓ Created index on jobs.dedupe_key")
+    except Exception as e:
+        print(f"⚠ Warning creating index on jobs.dedupe_key: {e}")
+    # Finished jobs are kept for JOB_RETENTION_DAYS, then removed
+    await ensure_ttl_index(db.jobs, "expire_at")
+    
     # Payment transactions
     await safe_create_index(db.payment_transactions, "id", unique=True)
     await safe_create_index(db.payment_transactions, "session_id", unique=True)
@@ -101,11 +146,13 @@ async def create_indexes():
     # Locations
     await safe_create_index(db.locations, "id", unique=True)
     await safe_create_index(db.locations, "school_id")
+    await safe_create_index(db.locations, [("school_id", 1), ("created_at", 1), ("id", 1)], name="locations_school_page")
     
     # Instructors
     await safe_create_index(db.instructors, "id", unique=True)
     await safe_create_index(db.instructors, "school_id")
     await safe_create_index(db.instructors, "available")
+    await safe_create_index(db.instructors, [("school_id", 1), ("created_at", 1), ("id", 1)], name="instructors_school_page")
     
     print("\n✅ All indexes created successfully!")
     print("\nYou can verify indexes by running:")
@@ -18,9 +18,14 @@ async def create_indexes():
     # Course Schedules indexes
     await db.course_schedules.create_index("course_id")
     await db.course_schedules.create_index("start_date")
+    await db.course_schedules.create_index("id", unique=True)
+    # Virtual schedules are expanded for location/instructor conflict checks
+    await db.course_schedules.create_index([("location_id", 1), ("virtual", 1), ("start_date", 1)])
+    await db.course_schedules.create_index([("instructor_id", 1), ("virtual", 1), ("start_date", 1)])
     print("✓ Course schedules indexes created")
     
     # Course Sessions indexes
+    await db.course_sessions.create_index("id", unique=True)
     await db.course_sessions.create_index("course_id")
     await db.course_sessions.create_index("schedule_id")
     await db.course_sessions.create_index("date")
@@ -29,6 +34,15 @@ async def create_indexes():
     await db.course_sessions.create_index("status")
     await db.course_sessions.create_index([("date", 1), ("location_id", 1)])
     await db.course_sessions.create_index([("date", 1), ("instructor_id", 1)])
+    # Conflict checks: equality on resource/date/status, range on the times
+    await db.course_sessions.create_index(
+        [("location_id", 1), ("date", 1), ("status", 1), ("start_time", 1), ("end_time", 1)], name="sessions_location_conflicts"
+    )
+    await db.course_sessions.create_index(
+        [("instructor_id", 1), ("date", 1), ("status", 1), ("start_time", 1), ("end_time", 1)], name="sessions_instructor_conflicts"
+    )
+    await db.course_sessions.create_index([("course_id", 1), ("date", 1), ("start_time", 1), ("id", 1)], name="sessions_course_page")
+    await db.course_sessions.create_index("booking_ids")
     print("✓ Course sessions indexes created")
     
     # Waitlist indexes
@@ -36,6 +50,7 @@ async def create_indexes():
     await db.waitlist.create_index("student_id")
     await db.waitlist.create_index("position")
     await db.waitlist.create_index([("course_id", 1), ("position", 1)])
+    await db.waitlist.create_index([("course_id", 1), ("notified", 1), ("position", 1)], name="waitlist_promotion")
     print("✓ Waitlist indexes created")
     
     # Instructor Availability indexes
@@ -46,6 +61,7 @@ async def create_indexes():
     # Location Calendar Blocks indexes
     await db.location_calendar_blocks.create_index("location_id")
     await db.location_calendar_blocks.create_index("start_date")
+    await db.location_calendar_blocks.create_index("id", unique=True)
     print("✓ Location calendar blocks indexes created")
     
     # Update bookings indexes for session support
@@ -6,6 +6,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 from pathlib import Path
+from collection_versions import bump_collection_versions
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -33,6 +34,9 @@ async def migrate():
         }
     )
     
+    if result.modified_count:
+        await bump_collection_versions(db, "courses")
+    
     print(f"✅ Migration complete! Updated {result.modified_count} courses")
     print(f"   Matched {result.matched_count} courses")
     
@@ -0,0 +1,114 @@
+"""
+Migration script to convert ISO-string datetime fields to native BSON dates
+
+Older documents were written with `.isoformat()` strings. The server now stores
+and reads native datetimes, so run this once after deploying. It works in
+batches and only selects fields that are still strings, so it can be stopped
+and re-run safely at any point.
+
+Usage:
+    python migrate_datetimes.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from pathlib import Path
+from collection_versions import bump_collection_versions
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# collection -> datetime fields that used to be stored as ISO strings
+DATETIME_FIELDS = {
+    "users": ["created_at"],
+    "user_sessions": ["expires_at", "created_at"],
+    "schools": ["created_at"],
+    "locations": ["created_at"],
+    "instructors": ["created_at"],
+    "courses": ["created_at"],
+    "bookings": ["booking_date"],
+    "payment_transactions": ["created_at", "paid_at"],
+    "course_schedules": ["created_at"],
+    "course_sessions": ["created_at"],
+    "waitlist": ["created_at", "offer_expires_at"],
+    "instructor_availability": ["created_at"],
+    "location_calendar_blocks": ["created_at"],
+}
+
+def parse_datetime(value: str):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+async def migrate_field(collection, field: str, batch_size: int):
+    """Convert one field in batches ordered by _id; returns (converted, skipped)"""
+    converted = 0
+    skipped = 0
+    last_id = None
+    while True:
+        query = {field: {"$type": "string"}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"_id": 1, field: 1}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        
+        operations = []
+        for doc in batch:
+            try:
+                operations.append(UpdateOne({"_id": doc["_id"], field: doc[field]}, {"$set": {field: parse_datetime(doc[field])}}))
+            except ValueError:
+                skipped += 1
+                print(f"  ⚠ {collection.name}.{field}: could not parse {doc[field]!r} (_id={doc['_id']})")
+        
+        if operations:
+            result = await collection.bulk_write(operations, ordered=False)
+            converted += result.modified_count
+        last_id = batch[-1]["_id"]
+    return converted, skipped
+
+async def migrate(batch_size: int):
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+    
+    print(f"Starting migration: ISO-string datetimes -> BSON dates (batch size {batch_size})...")
+    
+    total_converted = 0
+    total_skipped = 0
+    for collection_name, fields in DATETIME_FIELDS.items():
+        for field in fields:
+            converted, skipped = await migrate_field(db[collection_name], field, batch_size)
+            total_converted += converted
+            total_skipped += skipped
+            if converted or skipped:
+                print(f"✓ {collection_name}.{field}: converted {converted}, skipped {skipped}")
+    
+    if total_converted:
+        # Converted dates serialize differently; make clients and caches refetch
+        await bump_collection_versions(db, *DATETIME_FIELDS)
+    
+    print(f"\n✅ Migration complete! Converted {total_converted} fields, skipped {total_skipped}")
+    
+    # Verify
+    print(f"\n📊 Remaining string datetimes:")
+    for collection_name, fields in DATETIME_FIELDS.items():
+        for field in fields:
+            remaining = await db[collection_name].count_documents({field: {"$type": "string"}})
+            if remaining:
+                print(f"   {collection_name}.{field}: {remaining}")
+    
+    print("\nRun create_indexes.py next to enable the TTL index on user_sessions.expires_at")
+    
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size))
@@ -0,0 +1,69 @@
+"""
+Migration script to backfill courses.booked_seats from existing bookings
+
+create_booking admits students through an atomic per-course seat counter
+instead of counting bookings on every request. Run this once after deploying
+(and any time you want to reconcile the counters): it recounts pending and
+confirmed bookings per course and writes the result to booked_seats.
+
+Usage:
+    python migrate_seat_counters.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+from dotenv import load_dotenv
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# Must match SEAT_HOLDING_STATUSES in server.py
+SEAT_HOLDING_STATUSES = ["pending", "confirmed"]
+
+async def migrate(batch_size: int):
+    mongo_url = os.environ['MONGO_URL']
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[os.environ['DB_NAME']]
+
+    print("Counting seat-holding bookings per course...")
+    counts = {}
+    async for row in db.bookings.aggregate([
+        {"$match": {"status": {"$in": SEAT_HOLDING_STATUSES}}},
+        {"$group": {"_id": "$course_id", "booked": {"$sum": 1}}}
+    ]):
+        counts[row["_id"]] = row["booked"]
+
+    updated = 0
+    over_capacity = []
+    operations = []
+    async for course in db.courses.find({}, {"_id": 0, "id": 1, "title": 1, "capacity": 1, "booked_seats": 1}):
+        booked = counts.get(course["id"], 0)
+        if booked > course.get("capacity", 0):
+            over_capacity.append((course.get("title", course["id"]), booked, course.get("capacity", 0)))
+        if course.get("booked_seats") != booked:
+            operations.append(UpdateOne({"id": course["id"]}, {"$set": {"booked_seats": booked}}))
+        if len(operations) >= batch_size:
+            result = await db.courses.bulk_write(operations, ordered=False)
+            updated += result.modified_count
+            operations = []
+    if operations:
+        result = await db.courses.bulk_write(operations, ordered=False)
+        updated += result.modified_count
+
+    print(f"\n✅ Migration complete! Updated booked_seats on {updated} courses")
+
+    if over_capacity:
+        print(f"\n⚠ Courses already booked beyond capacity (new bookings will be refused until seats free up):")
+        for title, booked, capacity in over_capacity:
+            print(f"   {title}: {booked}/{capacity}")
+
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size))
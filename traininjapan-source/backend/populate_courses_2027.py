@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime, timezone
 import uuid
+from collection_versions import bump_collection_versions
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -237,7 +238,7 @@ async def populate_courses():
                 "name": "Admin",
                 "picture": "",
                 "role": "admin",
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "created_at": datetime.now(timezone.utc)
             }
             await db.users.insert_one(admin_user)
             print(f"  ✓ Created admin user: {admin_user['email']}")
@@ -255,7 +256,7 @@ async def populate_courses():
             "website": "https://traininjapan.com",
             "logo_url": "https://static.wixstatic.com/media/3ed8bf_67188e03f937488b930fb0a7c9b9a63e~mv2.jpg",
             "approved": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.schools.insert_one(school)
         print(f"  ✓ Created Kowakan Dojo school")
@@ -279,7 +280,7 @@ async def populate_courses():
             "capacity": 30,
             "facilities": ["Tatami mats", "Weapon racks", "Changing rooms", "Showers", "Tea room"],
             "description": "Traditional training hall with authentic Japanese atmosphere. Located near Matsumoto Castle.",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.locations.insert_one(location)
         print(f"  ✓ Created Main Dojo location")
@@ -304,7 +305,7 @@ async def populate_courses():
             "bio": "Our team of master instructors brings decades of combined experience in traditional Japanese martial arts and cultural practices. Each instructor maintains active lineage connections to their respective schools in Japan.",
             "specialties": ["Koryu Bujutsu", "Modern Budo", "Cultural Arts", "Weapons Training"],
             "available": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.instructors.insert_one(instructor)
         print(f"  ✓ Created Master Instructor Team")
@@ -336,7 +337,7 @@ async def populate_courses():
             "instructor_id": instructor_id,
             "status": "confirmed",  # Pre-approved for existing school
             "instructor_confirmed": True,
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_at": datetime.now(timezone.utc),
             **course_data
         }
         
@@ -344,6 +345,9 @@ async def populate_courses():
         created_count += 1
         print(f"  ✓ Created: {course_data['title']} (${course_data['price']:.2f} {course_data['currency']})")
     
+    # Catalog ETags and the API's catalog cache only see writes that bump these counters
+    await bump_collection_versions(db, "schools", "locations", "instructors", "courses")
+    
     print(f"\n✅ Successfully created {created_count} courses!")
     print(f"📅 All courses scheduled for 2027")
     print(f"🏯 Location: Kowakan Dojo, Matsumoto, Nagano")
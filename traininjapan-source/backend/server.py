@@ -1,25 +1,44 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Cookie, Response, Depends, Header, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Cookie, Response, Depends, Header, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, InsertOne, UpdateOne, UpdateMany
+from pymongo.errors import OperationFailure, BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter, PrivateAttr
+from typing import List, Optional, Dict, Tuple, Callable, Awaitable, Annotated
 import uuid
-from datetime import datetime, timezone, timedelta
+import json
+import bisect
+import itertools
+import random
+import socket
+import hmac
+import secrets
+import hashlib
+import base64
+from datetime import datetime, timezone, timedelta, date
+from email.utils import format_datetime, parsedate_to_datetime
 import httpx
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 from passlib.context import CryptContext
 import jwt
+import orjson
+from cachetools import TTLCache
+import collection_versions
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY', 'sk_test_emergent')
@@ -27,8 +46,61 @@ JWT_SECRET = os.environ.get('JWT_SECRET_KEY', 'your-secret-key')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 JWT_EXPIRATION_DAYS = int(os.environ.get('JWT_EXPIRATION_DAYS', '30'))
 
+# Resolved-session cache (see SessionCache below)
+SESSION_CACHE_TTL_SECONDS = int(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60'))
+SESSION_CACHE_MAX_ENTRIES = int(os.environ.get('SESSION_CACHE_MAX_ENTRIES', '10000'))
+SESSION_CACHE_SYNC_SECONDS = float(os.environ.get('SESSION_CACHE_SYNC_SECONDS', '1'))
+
+# Stateless JWT verification for password-login tokens (see get_current_user)
+JWT_STATELESS_AUTH = os.environ.get('JWT_STATELESS_AUTH', 'false').lower() == 'true'
+# Anyone who knows the signing key can mint tokens with any role, so stateless mode needs a real secret
+INSECURE_JWT_SECRETS = {'your-secret-key', 'your-random-secret-key', 'CHANGE_THIS_TO_A_RANDOM_32_CHARACTER_STRING'}
+if JWT_STATELESS_AUTH and (JWT_SECRET in INSECURE_JWT_SECRETS or len(JWT_SECRET) < 32):
+    raise RuntimeError("JWT_STATELESS_AUTH=true requires JWT_SECRET_KEY to be set to a random secret of at least 32 characters")
+JWT_REVOCATION_REFRESH_SECONDS = int(os.environ.get('JWT_REVOCATION_REFRESH_SECONDS', '30'))
+
+# Public catalog response cache (see CatalogCache)
+CATALOG_CACHE_TTL_SECONDS = int(os.environ.get('CATALOG_CACHE_TTL_SECONDS', '300'))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', '1000'))
+
+# Per-location course timelines used for location capacity validation
+OCCUPANCY_CACHE_TTL_SECONDS = int(os.environ.get('OCCUPANCY_CACHE_TTL_SECONDS', '3600'))
+OCCUPANCY_CACHE_MAX_ENTRIES = int(os.environ.get('OCCUPANCY_CACHE_MAX_ENTRIES', '1000'))
+
+# Serialize trusted Mongo documents straight to JSON with orjson (see ModelJSONSerializer)
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'true').lower() == 'true'
+
+# HTTP caching for public catalog/detail endpoints (see conditional_response)
+CATALOG_MAX_AGE_SECONDS = int(os.environ.get('CATALOG_MAX_AGE_SECONDS', '0'))
+CATALOG_STALE_WHILE_REVALIDATE_SECONDS = int(os.environ.get('CATALOG_STALE_WHILE_REVALIDATE_SECONDS', '0'))
+
+# Keyset pagination for list endpoints (see find_page). The frontend does not follow
+# X-Next-Cursor yet, so the default page matches the old to_list(1000) cap.
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '1000'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '1000'))
+
+# Compiled instructor availability / location block bitmaps (see SchedulingConstraints)
+CONSTRAINT_CACHE_TTL_SECONDS = int(os.environ.get('CONSTRAINT_CACHE_TTL_SECONDS', '3600'))
+CONSTRAINT_CACHE_MAX_ENTRIES = int(os.environ.get('CONSTRAINT_CACHE_MAX_ENTRIES', '2000'))
+
+# Background job queue (see enqueue_job). Set JOB_WORKERS=0 when running worker.py separately.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '1'))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', '60'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_POLL_SECONDS = float(os.environ.get('JOB_POLL_SECONDS', '1'))
+JOB_BACKOFF_SECONDS = int(os.environ.get('JOB_BACKOFF_SECONDS', '10'))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+
+# Multi-document transactions (needs a replica set; falls back to compensating writes without one)
+MONGO_TRANSACTIONS = os.environ.get('MONGO_TRANSACTIONS', 'true').lower() == 'true'
+
+# New schedules store only their recurrence rule; sessions are expanded on read (see materialize_sessions)
+VIRTUAL_SESSIONS = os.environ.get('VIRTUAL_SESSIONS', 'false').lower() == 'true'
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
 
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -49,6 +121,8 @@ class User(BaseModel):
     experience_level: Optional[str] = None
     school_id: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Set when built from stateless JWT claims, which carry no profile fields
+    _from_claims: bool = PrivateAttr(default=False)
 
 class UserSession(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -258,6 +332,11 @@ class CourseSchedule(BaseModel):
     recurrence_type: str  # "once", "daily", "weekly", "custom"
     recurrence_days: List[int] = Field(default_factory=list)  # [1,3,5] for Mon/Wed/Fri (1=Mon, 7=Sun)
     recurrence_interval: int = 1  # Every X days/weeks
+    virtual: bool = False  # Sessions are expanded on read and only stored once they carry state
+    # Copied from the course for virtual schedules, so their sessions can be expanded without it
+    location_id: Optional[str] = None
+    instructor_id: Optional[str] = None
+    max_capacity: Optional[int] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class CourseSession(BaseModel):
@@ -320,9 +399,22 @@ class ScheduleCreate(BaseModel):
     start_time: str
     end_time: str
     recurrence_type: str = "once"
-    recurrence_days: List[int] = Field(default_factory=list)
+    recurrence_days: List[Annotated[int, Field(ge=1, le=7)]] = Field(default_factory=list)  # ISO weekdays, 1=Mon..7=Sun
     recurrence_interval: int = 1
 
+class ScheduleConflictCheck(ScheduleCreate):
+    course_id: Optional[str] = None  # location/instructor default to the course's
+    location_id: Optional[str] = None
+    instructor_id: Optional[str] = None
+    exclude_schedule_id: Optional[str] = None  # ignore this schedule's own sessions when editing it
+
+class BatchConflictCheck(BaseModel):
+    course_id: Optional[str] = None
+    location_id: Optional[str] = None
+    instructor_id: Optional[str] = None
+    exclude_schedule_id: Optional[str] = None
+    candidates: List[ScheduleCreate]
+
 class SessionUpdate(BaseModel):
     status: Optional[str] = None
     max_capacity: Optional[int] = None
@@ -333,6 +425,24 @@ class AvailabilityCreate(BaseModel):
     end_time: str
     is_available: bool = True
 
+class SlotSearch(BaseModel):
+    start_date: str
+    end_date: str
+    sessions_per_week: int = Field(1, ge=1, le=7)
+    duration_minutes: int = Field(60, ge=5, le=24 * 60)
+    earliest_start: str = "07:00"
+    latest_end: str = "21:00"
+    preferred_start: Optional[str] = None  # defaults to the course's daily_start_time
+    start_step_minutes: int = Field(30, ge=5, le=240)
+    top_n: int = Field(5, ge=1, le=50)
+
+class CalendarBlockCreate(BaseModel):
+    start_date: str
+    end_date: str
+    start_time: str = "00:00"
+    end_time: str = "24:00"
+    reason: str
+
 class WaitlistCreate(BaseModel):
     student_name: str
     student_email: str
@@ -343,8 +453,823 @@ class CheckoutRequest(BaseModel):
     origin_url: str
 
 
+# ==================== SESSION CACHE ====================
+
+class SessionCache:
+    """Bounded in-process cache of session token -> resolved User.
+
+    Entries live for at most SESSION_CACHE_TTL_SECONDS and never past the
+    session's own expires_at. Anything that deletes a session or changes a
+    user's role/school must invalidate it here as well.
+
+    Invalidations are shared between workers through the "user_sessions"
+    collection version: each one bumps it and records the affected user id
+    under that sequence number in session_invalidations. Every worker checks
+    the counter at most once per SESSION_CACHE_SYNC_SECONDS and evicts just
+    those users; only when a sequence number has no log entry (it expired, or
+    its writer died mid-way) does it drop everything.
+    """
+
+    # Log entries outlive any realistic gap between two syncs of a live worker
+    LOG_RETENTION_SECONDS = 3600
+
+    def __init__(self, maxsize: int, ttl: int, sync_seconds: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.sync_seconds = sync_seconds
+        self._version = None
+        self._synced_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.remote_invalidations = 0
+        self.full_flushes = 0
+
+    async def sync(self):
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_seconds:
+            return
+        self._synced_at = now
+        version = (await get_collection_versions("user_sessions"))["user_sessions"]
+        if self._version is None or version <= self._version:
+            self._version = max(version, self._version or 0)
+            return
+        entries = await db.session_invalidations.find(
+            {"seq": {"$gt": self._version, "$lte": version}}, {"_id": 0, "user_id": 1}
+        ).to_list(None)
+        if len(entries) < version - self._version:
+            self._entries.clear()
+            self.full_flushes += 1
+        else:
+            self._evict({entry["user_id"] for entry in entries})
+            self.remote_invalidations += len(entries)
+        self._version = version
+
+    def _evict(self, user_ids: set):
+        for token, (user, _) in list(self._entries.items()):
+            if user.id in user_ids:
+                self._entries.pop(token, None)
+
+    async def _publish(self, user_id: str):
+        version = await bump_collection_version("user_sessions")
+        await db.session_invalidations.insert_one({
+            "seq": version,
+            "user_id": user_id,
+            "expire_at": datetime.now(timezone.utc) + timedelta(seconds=self.LOG_RETENTION_SECONDS)
+        })
+        # Our own entry needs no processing; anything in between came from another worker
+        if self._version is not None and version == self._version + 1:
+            self._version = version
+
+    def get(self, token: str) -> Optional[User]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        user, expires_at = entry
+        if expires_at < datetime.now(timezone.utc):
+            self._entries.pop(token, None)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return user
+
+    def put(self, token: str, user: User, expires_at: datetime):
+        self._entries[token] = (user, expires_at)
+
+    async def invalidate_token(self, token: str, user_id: str):
+        """Drop a deleted session; other workers evict its user's entries"""
+        self._entries.pop(token, None)
+        await self._publish(user_id)
+
+    async def invalidate_user(self, user_id: str):
+        self._evict({user_id})
+        await self._publish(user_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "remote_invalidations": self.remote_invalidations,
+            "full_flushes": self.full_flushes
+        }
+
+session_cache = SessionCache(maxsize=SESSION_CACHE_MAX_ENTRIES, ttl=SESSION_CACHE_TTL_SECONDS, sync_seconds=SESSION_CACHE_SYNC_SECONDS)
+
+# ==================== TOKEN REVOCATION ====================
+
+class TokenRevocationList:
+    """Process-local copy of the revoked_tokens collection.
+
+    Stateless JWTs are never looked up per request, so revocation works off
+    this compact set instead: revoked token ids (jti) plus per-user cutoffs
+    for forced sign-out. It is reloaded from Mongo at most once every
+    JWT_REVOCATION_REFRESH_SECONDS; revocations made by this process apply
+    immediately, revocations from other workers within one refresh period.
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._revoked_jtis = {}
+        self._user_cutoffs = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+
+    async def refresh_if_stale(self):
+        now = datetime.now(timezone.utc)
+        if self._loaded_at and (now - self._loaded_at).total_seconds() < self.refresh_seconds:
+            return
+        async with self._lock:
+            if self._loaded_at and (now - self._loaded_at).total_seconds() < self.refresh_seconds:
+                return
+            revoked_jtis = {}
+            user_cutoffs = {}
+            async for entry in db.revoked_tokens.find({"expires_at": {"$gt": now}}, {"_id": 0}):
+                if entry.get("jti"):
+                    revoked_jtis[entry["jti"]] = entry["expires_at"]
+                if entry.get("not_before"):
+                    cutoff = entry["not_before"].timestamp()
+                    user_cutoffs[entry["user_id"]] = max(cutoff, user_cutoffs.get(entry["user_id"], 0))
+            self._revoked_jtis = revoked_jtis
+            self._user_cutoffs = user_cutoffs
+            self._loaded_at = now
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims.get("jti") in self._revoked_jtis:
+            return True
+        cutoff = self._user_cutoffs.get(claims["user_id"])
+        return cutoff is not None and claims.get("iat", 0) < cutoff
+
+    async def revoke_token(self, claims: dict):
+        expires_at = datetime.fromtimestamp(claims["exp"], tz=timezone.utc)
+        self._revoked_jtis[claims["jti"]] = expires_at
+        await db.revoked_tokens.insert_one({"jti": claims["jti"], "user_id": claims["user_id"], "expires_at": expires_at})
+
+    async def revoke_user(self, user_id: str):
+        """Force sign-out: every token issued to user_id before now stops working"""
+        now = datetime.now(timezone.utc).replace(microsecond=0)
+        expires_at = now + timedelta(days=JWT_EXPIRATION_DAYS)
+        self._user_cutoffs[user_id] = now.timestamp()
+        # One cutoff document per user - logins call this too
+        await db.revoked_tokens.update_one(
+            {"user_id": user_id, "jti": None},
+            {"$set": {"not_before": now, "expires_at": expires_at}},
+            upsert=True
+        )
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self._revoked_jtis),
+            "revoked_users": len(self._user_cutoffs),
+            "loaded_at": self._loaded_at.isoformat() if self._loaded_at else None
+        }
+
+token_revocations = TokenRevocationList(refresh_seconds=JWT_REVOCATION_REFRESH_SECONDS)
+
+def decode_jwt_token(token: str, verify_exp: bool = True) -> Optional[dict]:
+    """Return the claims of one of our stateless JWTs, or None for any other token.
+
+    Emergent OAuth session tokens and JWTs issued before role/school claims
+    were added come back as None so the caller can fall back to user_sessions.
+    """
+    try:
+        claims = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"verify_exp": verify_exp})
+    except jwt.ExpiredSignatureError:
+        raise
+    except jwt.InvalidTokenError:
+        return None
+    if "jti" not in claims or "role" not in claims:
+        return None
+    return claims
+
+def user_from_claims(claims: dict) -> User:
+    user = User(
+        id=claims["user_id"],
+        email=claims["email"],
+        name=claims["name"],
+        picture=claims["picture"],
+        role=claims["role"],
+        school_id=claims.get("school_id")
+    )
+    user._from_claims = True
+    return user
+
+# ==================== PAGINATION ====================
+
+class PageParams(BaseModel):
+    cursor: Optional[str] = None
+    limit: int = DEFAULT_PAGE_SIZE
+
+def page_params(cursor: Optional[str] = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)) -> PageParams:
+    return PageParams(cursor=cursor, limit=limit)
+
+def encode_cursor(values: list) -> str:
+    """Opaque cursor from the sort-key values of the last document on a page"""
+    payload = [{"$dt": v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode()).decode()
+
+def decode_cursor(cursor: str, expected_len: int) -> list:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values = [datetime.fromisoformat(v["$dt"]) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if len(values) != expected_len:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+async def find_page(collection, query: dict, sort_fields: List[str], page: PageParams, response: Response, projection: Optional[dict] = None) -> List[dict]:
+    """One page of documents ordered by sort_fields (the last one must be unique, normally "id").
+
+    The position is carried as a keyset cursor rather than a skip offset, so
+    every page is a bounded index range scan no matter how deep the client
+    has paged. The cursor for the next page is returned in X-Next-Cursor.
+    """
+    if page.cursor:
+        values = decode_cursor(page.cursor, len(sort_fields))
+        # (f1 > v1) OR (f1 = v1 AND f2 > v2) OR ...
+        keyset = []
+        for i, field in enumerate(sort_fields):
+            clause = {sort_fields[j]: values[j] for j in range(i)}
+            clause[field] = {"$gt": values[i]}
+            keyset.append(clause)
+        query = {"$and": [query, {"$or": keyset}]}
+    
+    docs = await collection.find(query, projection or {"_id": 0}).sort([(f, 1) for f in sort_fields]).limit(page.limit + 1).to_list(page.limit + 1)
+    if len(docs) > page.limit:
+        docs = docs[:page.limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([docs[-1].get(f) for f in sort_fields])
+    return docs
+
+# ==================== HTTP CACHING ====================
+
+async def get_collection_versions(*names: str) -> dict:
+    """Current write counters for the given collections (0 if never written)"""
+    versions, _ = await get_collection_versions_with_stamp(*names)
+    return versions
+
+async def get_collection_versions_with_stamp(*names: str) -> Tuple[dict, Optional[datetime]]:
+    """get_collection_versions plus the time of the latest of those writes (for Last-Modified)"""
+    docs = await db.collection_versions.find({"_id": {"$in": list(names)}}).to_list(len(names))
+    versions = {name: 0 for name in names}
+    versions.update({doc["_id"]: doc["version"] for doc in docs})
+    stamps = [doc["updated_at"] for doc in docs if doc.get("updated_at")]
+    return versions, max(stamps) if stamps else None
+
+async def bump_collection_version(name: str) -> int:
+    """Call after every write that changes what a public GET of this collection returns
+    (scripts writing outside the API must do the same, see collection_versions.py)"""
+    return await collection_versions.bump_collection_version(db, name)
+
+def make_etag(versions: dict) -> str:
+    return '"' + "-".join(f"{name}.{versions[name]}" for name in sorted(versions)) + '"'
+
+def catalog_cache_control() -> str:
+    directives = ["public", f"max-age={CATALOG_MAX_AGE_SECONDS}"]
+    if CATALOG_STALE_WHILE_REVALIDATE_SECONDS:
+        directives.append(f"stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE_SECONDS}")
+    return ", ".join(directives)
+
+def conditional_response(etag: str, if_none_match: Optional[str], response: Optional[Response] = None) -> Optional[Response]:
+    """Set ETag/Cache-Control on response; return a 304 if the client already has this version"""
+    headers = {"ETag": etag, "Cache-Control": catalog_cache_control()}
+    if response is not None:
+        response.headers.update(headers)
+    if if_none_match and etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    return None
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """Weak comparison against an If-None-Match list (proxies may add W/ to our strong tags)"""
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+# ==================== FAST JSON ====================
+
+# Pydantic writes UTC datetimes as "...Z"; orjson defaults to "+00:00". Match the response_model wire format.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+class FastJSONResponse(Response):
+    """application/json response for bodies that are already encoded (anything else goes through orjson)"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+def encode_json(payload) -> bytes:
+    if FAST_JSON_RESPONSES:
+        return orjson.dumps(payload, option=ORJSON_OPTIONS)
+    return json.dumps(jsonable_encoder(payload), separators=(",", ":")).encode()
+
+def json_response(body: bytes, response: Optional[Response] = None) -> FastJSONResponse:
+    """Wrap an encoded body, keeping pagination/caching headers already set on the injected response"""
+    headers = {}
+    if response is not None:
+        headers = {name: response.headers[name] for name in ("X-Next-Cursor", "ETag", "Cache-Control") if name in response.headers}
+    return FastJSONResponse(content=body, headers=headers)
+
+class ModelJSONSerializer:
+    """Precompiled JSON serializer for Mongo documents of one response model.
+
+    Endpoints that opt in fetch with `projection`, so documents already hold
+    only the model's fields. With FAST_JSON_RESPONSES on they are topped up
+    with field defaults and encoded by orjson - no per-document Pydantic
+    validation followed by a second jsonable_encoder pass as response_model
+    would do. With it off, a TypeAdapter compiled once at import validates
+    and dumps them instead.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.projection = {"_id": 0, **{name: 1 for name in model.model_fields}}
+        self._list_adapter = TypeAdapter(List[model])
+        # Pydantic writes a float field holding 1450 as 1450.0; orjson would keep the int
+        self._float_fields = [name for name, field in model.model_fields.items() if field.annotation in (float, Optional[float])]
+
+    def _defaults(self) -> dict:
+        """Defaults for fields missing from legacy documents.
+
+        Generated defaults (a fresh uuid id, created_at=now) are left out: they
+        would come back different on every response. Empty-container factories
+        are kept.
+        """
+        defaults = {}
+        for name, field in self.model.model_fields.items():
+            if field.is_required():
+                continue
+            if field.default_factory is None:
+                defaults[name] = field.default
+            elif field.default_factory in (list, dict):
+                defaults[name] = field.default_factory()
+        return defaults
+
+    def prepare(self, docs: List[dict]) -> List[dict]:
+        """JSON-ready dicts for docs, for callers that add fields before encoding"""
+        if FAST_JSON_RESPONSES:
+            defaults = self._defaults()
+            prepared = [{**defaults, **doc} for doc in docs]
+            for doc in prepared:
+                for name in self._float_fields:
+                    value = doc.get(name)
+                    if type(value) is int:
+                        doc[name] = float(value)
+            return prepared
+        return self._list_adapter.dump_python(self._list_adapter.validate_python(docs), mode="json")
+
+    def dump_list(self, docs: List[dict]) -> bytes:
+        if FAST_JSON_RESPONSES:
+            return encode_json(self.prepare(docs))
+        return self._list_adapter.dump_json(self._list_adapter.validate_python(docs))
+
+    def dump_one(self, doc: dict) -> bytes:
+        return encode_json(self.prepare([doc])[0])
+
+COURSE_JSON = ModelJSONSerializer(Course)
+SCHOOL_JSON = ModelJSONSerializer(School)
+LOCATION_JSON = ModelJSONSerializer(Location)
+INSTRUCTOR_JSON = ModelJSONSerializer(Instructor)
+BOOKING_JSON = ModelJSONSerializer(Booking)
+
+# ==================== CATALOG CACHE ====================
+
+# Filters shared by /courses and /programs, in cache-key order
+CATALOG_FILTER_FIELDS = ("school_id", "location_id", "instructor_id", "martial_arts_style", "experience_level")
+
+class CatalogCache:
+    """Serialized /programs, /courses and /courses/{id} responses.
+
+    List entries are keyed by (endpoint, filter tuple, cursor, limit), detail
+    entries by ("course", course_id). Course writes drop every entry whose
+    filters the course matches (before or after the write); school writes drop
+    the /programs entries that embed that school's branding.
+
+    Each entry also remembers the collection versions it was built from, and
+    is only served while they still match, so writes handled by other worker
+    processes are picked up on the next request rather than after the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def list_key(endpoint: str, filters: tuple, page: PageParams) -> tuple:
+        return (endpoint, filters, page.cursor, page.limit)
+
+    def get(self, key: tuple, versions: dict, response: Response) -> Optional[Response]:
+        entry = self._entries.get(key)
+        if entry is None or entry["versions"] != versions:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if entry["next_cursor"]:
+            response.headers["X-Next-Cursor"] = entry["next_cursor"]
+        return json_response(entry["body"], response)
+
+    def put(self, key: tuple, versions: dict, body: bytes, response: Response, school_ids: Optional[set] = None) -> Response:
+        """Remember an encoded body under key and return it as the response"""
+        self._entries[key] = {
+            "body": body,
+            "next_cursor": response.headers.get("X-Next-Cursor"),
+            "versions": versions,
+            "school_ids": school_ids or set()
+        }
+        return json_response(body, response)
+
+    def _drop(self, predicate):
+        for key, entry in list(self._entries.items()):
+            if predicate(key, entry):
+                self._entries.pop(key, None)
+                self.invalidations += 1
+
+    def invalidate_course(self, *course_docs: dict):
+        """Pass the course as it was before and after the write"""
+        docs = [doc for doc in course_docs if doc]
+        course_ids = {doc["id"] for doc in docs}
+        
+        def affected(key, entry):
+            if key[0] == "course":
+                return key[1] in course_ids
+            filters = key[1]
+            return any(
+                all(value is None or doc.get(field) == value for field, value in zip(CATALOG_FILTER_FIELDS, filters))
+                for doc in docs
+            )
+        self._drop(affected)
+
+    def invalidate_school(self, school_id: str):
+        self._drop(lambda key, entry: school_id in entry["school_ids"])
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl
+        }
+
+catalog_cache = CatalogCache(maxsize=CATALOG_CACHE_MAX_ENTRIES, ttl=CATALOG_CACHE_TTL_SECONDS)
+
+# ==================== LOCATION OCCUPANCY ====================
+
+# Course statuses that hold seats at their location
+OCCUPANCY_STATUSES = ["confirmed", "active", "pending_first_approval"]
+
+def as_date(value: str) -> date:
+    """Course start/end dates are "YYYY-MM-DD" (older documents may carry a time part)"""
+    return datetime.fromisoformat(value).date()
+
+class LocationOccupancy:
+    """Per-location course timelines for capacity checks.
+
+    Each entry holds the seat-holding courses at one location that end on or
+    after the entry's floor date, keyed by course id. A capacity check sweeps
+    the course intervals that overlap the requested range, so only courses
+    that are actually running on the same day add up.
+
+    Entries carry the location's "occupancy:<location_id>" counter from
+    collection_versions. Course writes go through record(), which bumps that
+    counter and patches the local entry in place when nothing else changed
+    the location in between; other workers see the new counter and reload.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.patches = 0
+
+    @staticmethod
+    def version_key(location_id: str) -> str:
+        return f"occupancy:{location_id}"
+
+    @staticmethod
+    def _interval(course: dict) -> Tuple[date, date, int, str]:
+        return as_date(course["start_date"]), as_date(course["end_date"]), course["capacity"], course["title"]
+
+    async def _timeline(self, location_id: str, start: date) -> dict:
+        key = self.version_key(location_id)
+        version = (await get_collection_versions(key))[key]
+        entry = self._entries.get(location_id)
+        if entry is not None and entry["version"] == version and entry["floor"] <= start:
+            self.hits += 1
+            return entry["courses"]
+        self.misses += 1
+        
+        floor = min(start, datetime.now(timezone.utc).date())
+        courses = await db.courses.find(
+            {"location_id": location_id, "status": {"$in": OCCUPANCY_STATUSES}, "end_date": {"$gte": floor.isoformat()}},
+            {"_id": 0, "id": 1, "title": 1, "start_date": 1, "end_date": 1, "capacity": 1}
+        ).to_list(None)
+        timeline = {course["id"]: self._interval(course) for course in courses}
+        self._entries[location_id] = {"version": version, "floor": floor, "courses": timeline}
+        return timeline
+
+    async def conflicts(self, location: dict, start: date, end: date, capacity: int, exclude_course_id: Optional[str] = None) -> List[dict]:
+        """Day ranges in [start, end] where existing courses plus `capacity` exceed the location's capacity"""
+        timeline = await self._timeline(location["id"], start)
+        
+        # +capacity on a course's first overlapping day, -capacity the day after its last
+        events: Dict[date, List[Tuple[int, str, str]]] = {}
+        for course_id, (course_start, course_end, course_capacity, title) in timeline.items():
+            if course_id == exclude_course_id or course_end < start or course_start > end:
+                continue
+            events.setdefault(max(course_start, start), []).append((course_capacity, course_id, title))
+            events.setdefault(min(course_end, end) + timedelta(days=1), []).append((-course_capacity, course_id, title))
+        
+        conflicts = []
+        active: Dict[str, str] = {}
+        load = 0
+        days = sorted(events)
+        for day, next_day in zip(days, days[1:]):
+            for delta, course_id, title in events[day]:
+                load += delta
+                if delta > 0:
+                    active[course_id] = title
+                else:
+                    active.pop(course_id, None)
+            if load + capacity <= location["capacity"]:
+                continue
+            last_day = next_day - timedelta(days=1)
+            if conflicts and conflicts[-1]["end"] == day - timedelta(days=1):
+                conflict = conflicts[-1]
+                conflict["end"] = last_day
+                conflict["existing"] = max(conflict["existing"], load)
+                conflict["courses"].update(active)
+            else:
+                conflicts.append({"start": day, "end": last_day, "existing": load, "courses": dict(active)})
+        return conflicts
+
+    async def record(self, before: Optional[dict], after: Optional[dict]):
+        """Call after a course write with the document before and after it (None when absent)"""
+        location_ids = {doc["location_id"] for doc in (before, after) if doc}
+        for location_id in location_ids:
+            version = await bump_collection_version(self.version_key(location_id))
+            entry = self._entries.get(location_id)
+            if entry is None:
+                continue
+            if entry["version"] != version - 1:
+                self._entries.pop(location_id, None)
+                continue
+            for doc in (before, after):
+                if doc:
+                    entry["courses"].pop(doc["id"], None)
+            if (
+                after and after["location_id"] == location_id and after.get("status") in OCCUPANCY_STATUSES
+                and as_date(after["end_date"]) >= entry["floor"]
+            ):
+                entry["courses"][after["id"]] = self._interval(after)
+            entry["version"] = version
+            self.patches += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "patches": self.patches,
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl
+        }
+
+location_occupancy = LocationOccupancy(maxsize=OCCUPANCY_CACHE_MAX_ENTRIES, ttl=OCCUPANCY_CACHE_TTL_SECONDS)
+
+async def check_location_capacity(location: dict, course_data, exclude_course_id: Optional[str] = None):
+    """Raise 400 if the course would push the location over capacity on any day it runs"""
+    if course_data.capacity > location["capacity"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Course capacity ({course_data.capacity}) cannot exceed location capacity ({location['capacity']})"
+        )
+    
+    conflicts = await location_occupancy.conflicts(
+        location, as_date(course_data.start_date), as_date(course_data.end_date), course_data.capacity, exclude_course_id
+    )
+    if not conflicts:
+        return
+    
+    lines = []
+    for conflict in conflicts:
+        days = conflict["start"].isoformat()
+        if conflict["end"] != conflict["start"]:
+            days += f" to {conflict['end'].isoformat()}"
+        lines.append(
+            f"- {days}: {', '.join(conflict['courses'].values())} already use {conflict['existing']} places "
+            f"({conflict['existing'] + course_data.capacity} with your course)"
+        )
+    raise HTTPException(
+        status_code=400,
+        detail=f"Location capacity exceeded. {location['name']} can accommodate {location['capacity']} students maximum.\n\n"
+               f"Conflicting days:\n" + "\n".join(lines)
+    )
+
+# ==================== JOB QUEUE ====================
+
+# Job type -> async handler(payload). Register with @job_handler next to the code the job belongs to.
+JOB_HANDLERS: Dict[str, Callable[[dict], Awaitable[None]]] = {}
+
+def job_handler(job_type: str):
+    def register(handler):
+        JOB_HANDLERS[job_type] = handler
+        return handler
+    return register
+
+async def enqueue_job(
+    job_type: str,
+    payload: dict,
+    delay_seconds: float = 0,
+    dedupe_key: Optional[str] = None,
+    job_id: Optional[str] = None
+) -> str:
+    """Persist a job for the workers and return its id right away.
+
+    dedupe_key only collapses jobs that are still queued or running (it is
+    removed when a job finishes), so the same work can be queued again
+    later. A caller-chosen job_id is permanent for as long as the job is
+    retained: enqueueing it again is a no-op even after it has run.
+    """
+    now = datetime.now(timezone.utc)
+    job = {
+        "id": job_id or str(uuid.uuid4()),
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "run_at": now + timedelta(seconds=delay_seconds),
+        "created_at": now
+    }
+    if dedupe_key:
+        job["dedupe_key"] = dedupe_key
+    for _ in range(2):
+        try:
+            await db.jobs.insert_one(job)
+            return job["id"]
+        except DuplicateKeyError:
+            if job_id and await db.jobs.find_one({"id": job_id}, {"_id": 1}):
+                return job_id
+            existing = await db.jobs.find_one({"dedupe_key": dedupe_key}, {"_id": 0, "id": 1}) if dedupe_key else None
+            if existing:
+                return existing["id"]
+            # The duplicate finished in between; queue this one after all
+    raise RuntimeError(f"Could not enqueue {job_type} job")
+
+class JobWorker:
+    """Claims and runs jobs from the jobs collection.
+
+    A claim is one find_one_and_update that takes the oldest due job - queued,
+    or running with an expired lease (its worker died) - and leases it to
+    this worker. The lease is renewed while the handler runs. Failures are
+    retried with exponential backoff; after JOB_MAX_ATTEMPTS the job is
+    moved to the "dead" state for an admin to inspect and retry. A job whose
+    lease expires on its last attempt is moved there too instead of being
+    run again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lte": now}, "attempts": {"$lt": JOB_MAX_ATTEMPTS}}
+            ]},
+            {
+                "$set": {"status": "running", "locked_by": self.name, "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def bury_abandoned(self):
+        """Jobs whose worker died during their last allowed attempt"""
+        now = datetime.now(timezone.utc)
+        result = await db.jobs.update_many(
+            {"status": "running", "lease_expires_at": {"$lte": now}, "attempts": {"$gte": JOB_MAX_ATTEMPTS}},
+            {
+                "$set": {"status": "dead", "dead_at": now, "last_error": "Lease expired on the last attempt"},
+                "$unset": {"locked_by": "", "lease_expires_at": "", "dedupe_key": ""}
+            }
+        )
+        if result.modified_count:
+            logger.error(f"{result.modified_count} job(s) are dead after their lease expired on the last attempt")
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            await db.jobs.update_one(
+                {"id": job_id, "locked_by": self.name, "status": "running"},
+                {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)}}
+            )
+
+    async def run(self, job: dict):
+        owned = {"id": job["id"], "locked_by": self.name, "status": "running"}
+        handler = JOB_HANDLERS.get(job["type"])
+        renewal = asyncio.create_task(self._renew_lease(job["id"]))
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job type {job['type']!r}")
+            await handler(job["payload"])
+        except Exception as e:
+            self.failed += 1
+            now = datetime.now(timezone.utc)
+            if job["attempts"] >= JOB_MAX_ATTEMPTS:
+                update = {"$set": {"status": "dead", "dead_at": now, "last_error": repr(e)[:2000]}, "$unset": {"dedupe_key": ""}}
+                logger.error(f"Job {job['id']} ({job['type']}) is dead after {job['attempts']} attempts: {e!r}")
+            else:
+                delay = JOB_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1) * random.uniform(0.8, 1.2)
+                update = {"$set": {"status": "queued", "run_at": now + timedelta(seconds=delay), "last_error": repr(e)[:2000]}, "$unset": {}}
+                logger.warning(f"Job {job['id']} ({job['type']}) failed (attempt {job['attempts']}), retrying in {delay:.0f}s: {e!r}")
+            update["$unset"].update({"locked_by": "", "lease_expires_at": ""})
+            await db.jobs.update_one(owned, update)
+        else:
+            self.processed += 1
+            now = datetime.now(timezone.utc)
+            await db.jobs.update_one(owned, {
+                "$set": {"status": "done", "finished_at": now, "expire_at": now + timedelta(days=JOB_RETENTION_DAYS)},
+                "$unset": {"locked_by": "", "lease_expires_at": "", "dedupe_key": ""}
+            })
+        finally:
+            renewal.cancel()
+
+    async def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                job = await self.claim()
+                if job is None:
+                    await self.bury_abandoned()
+            except Exception as e:
+                logger.error(f"Job worker {self.name} could not claim a job: {e!r}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=JOB_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self.run(job)
+            except Exception as e:
+                # Recording the outcome failed; the job is picked up again when its lease expires
+                logger.error(f"Job worker {self.name} could not record the outcome of job {job['id']}: {e!r}")
+
+def start_job_workers(count: int) -> List[Tuple[JobWorker, asyncio.Task]]:
+    workers = []
+    for number in range(count):
+        worker = JobWorker(f"{socket.gethostname()}:{os.getpid()}:{number}")
+        workers.append((worker, asyncio.create_task(worker.run_forever())))
+    return workers
+
+async def stop_job_workers(workers: List[Tuple[JobWorker, asyncio.Task]], timeout: float = 10):
+    """Let running jobs finish, cancelling any still running after timeout.
+
+    Cancelled jobs keep their lease and are picked up again once it expires.
+    Returns only when every worker task has ended, so the Mongo client can be
+    closed afterwards.
+    """
+    for worker, _ in workers:
+        worker.stop()
+    tasks = [task for _, task in workers]
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+in_app_job_workers: List[Tuple[JobWorker, asyncio.Task]] = []
+
 # ==================== AUTH ====================
 
+# Only the fields the User model needs come back from the session lookup
+SESSION_USER_PROJECTION = {"_id": 0, "expires_at": 1, **{f"user.{field}": 1 for field in User.model_fields}}
+
 async def get_current_user(session_token: Optional[str] = Cookie(None), authorization: Optional[str] = Header(None)):
     token = session_token
     if not token and authorization:
@@ -352,23 +1277,50 @@ async def get_current_user(session_token: Optional[str] = Cookie(None), authoriz
             token = authorization.replace("Bearer ", "")
     if not token:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    session = await db.user_sessions.find_one({"session_token": token})
-    if not session:
-        raise HTTPException(status_code=401, detail="Invalid session")
     
-    # Convert expires_at to datetime if it's a string
-    expires_at = session["expires_at"]
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    
-    if expires_at < datetime.now(timezone.utc):
-        await db.user_sessions.delete_one({"session_token": token})
-        raise HTTPException(status_code=401, detail="Session expired")
-    
-    user = await db.users.find_one({"id": session["user_id"]}, {"_id": 0})
-    if not user:
+    # Password-login JWTs: verify signature/exp locally, no database work
+    if JWT_STATELESS_AUTH:
+        try:
+            claims = decode_jwt_token(token)
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(status_code=401, detail="Session expired")
+        if claims:
+            await token_revocations.refresh_if_stale()
+            if token_revocations.is_revoked(claims):
+                raise HTTPException(status_code=401, detail="Session revoked")
+            user = user_from_claims(claims)
+            if user.role == "admin":
+                # Admin rights are confirmed against users on every request, so a demotion applies at once
+                stored = await db.users.find_one({"id": user.id}, {"_id": 0, "role": 1, "school_id": 1})
+                if not stored:
+                    raise HTTPException(status_code=401, detail="Invalid or expired session")
+                user = user.model_copy(update={"role": stored.get("role", "student"), "school_id": stored.get("school_id")})
+            return user
+    
+    await session_cache.sync()
+    cached_user = session_cache.get(token)
+    if cached_user:
+        return cached_user
+    
+    # Resolve session + user in one round-trip; expired sessions are filtered server-side
+    now = datetime.now(timezone.utc)
+    pipeline = [
+        {"$match": {"session_token": token, "expires_at": {"$gt": now}}},
+        {"$limit": 1},
+        {"$lookup": {"from": "users", "localField": "user_id", "foreignField": "id", "as": "user"}},
+        {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}},
+        {"$project": SESSION_USER_PROJECTION}
+    ]
+    results = await db.user_sessions.aggregate(pipeline).to_list(1)
+    if not results:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    session = results[0]
+    if not session.get("user"):
         raise HTTPException(status_code=404, detail="User not found")
-    return User(**user)
+    
+    user = User(**session["user"])
+    session_cache.put(token, user, session["expires_at"])
+    return user
 
 @api_router.post("/auth/session")
 async def create_session(response: Response, session_id: str = Header(..., alias="X-Session-ID")):
@@ -385,7 +1337,6 @@ async def create_session(response: Response, session_id: str = Header(..., alias
     if not existing_user:
         user = User(id=user_id, email=session_data["email"], name=session_data["name"], picture=session_data["picture"])
         user_dict = user.model_dump()
-        user_dict["created_at"] = user_dict["created_at"].isoformat()
         await db.users.insert_one(user_dict)
     else:
         user_id = existing_user["id"]
@@ -394,23 +1345,33 @@ async def create_session(response: Response, session_id: str = Header(..., alias
     
     # Delete old sessions for this user to prevent duplicate key errors
     await db.user_sessions.delete_many({"user_id": user_id})
+    await session_cache.invalidate_user(user_id)
     
     session = UserSession(user_id=user_id, session_token=session_token, expires_at=expires_at)
     session_dict = session.model_dump()
-    session_dict["expires_at"] = session_dict["expires_at"].isoformat()
-    session_dict["created_at"] = session_dict["created_at"].isoformat()
     await db.user_sessions.insert_one(session_dict)
     response.set_cookie(key="session_token", value=session_token, httponly=True, secure=True, samesite="none", max_age=7*24*60*60, path="/")
     return {"success": True, "user_id": user_id}
 
 @api_router.get("/auth/me")
 async def get_me(current_user: User = Depends(get_current_user)):
-    return current_user
+    # Session-backed users already hold the full profile; JWT claims only carry identity/role
+    if not current_user._from_claims:
+        return current_user
+    user = await db.users.find_one({"id": current_user.id}, {"_id": 0, "password_hash": 0})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return User(**user)
 
 @api_router.post("/auth/logout")
 async def logout(response: Response, session_token: Optional[str] = Cookie(None)):
     if session_token:
-        await db.user_sessions.delete_one({"session_token": session_token})
+        deleted = await db.user_sessions.find_one_and_delete({"session_token": session_token}, projection={"_id": 0, "user_id": 1})
+        if deleted:
+            await session_cache.invalidate_token(session_token, deleted["user_id"])
+        claims = decode_jwt_token(session_token, verify_exp=False)
+        if claims:
+            await token_revocations.revoke_token(claims)
     response.delete_cookie(key="session_token", path="/", samesite="none", secure=True)
     return {"success": True}
 
@@ -425,20 +1386,103 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+class PasswordHashPool:
+    """Runs bcrypt work on a dedicated, size-limited thread pool.
+
+    bcrypt releases the GIL, so a few threads keep the event loop free while
+    logins are hashed. At most max_pending calls may be queued or running;
+    beyond that callers get a 503 instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.hash_time_total = 0.0
+        self.hash_time_max = 0.0
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many sign-in requests, please try again shortly", headers={"Retry-After": "1"})
+        
+        submitted = time.perf_counter()
+        
+        def timed_call():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started - submitted, time.perf_counter() - started
+        
+        self.pending += 1
+        try:
+            result, queue_wait, hash_time = await asyncio.get_running_loop().run_in_executor(self._executor, timed_call)
+        finally:
+            self.pending -= 1
+        
+        self.completed += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        self.hash_time_total += hash_time
+        self.hash_time_max = max(self.hash_time_max, hash_time)
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_avg_ms": round(self.queue_wait_total / completed * 1000, 2),
+            "queue_wait_max_ms": round(self.queue_wait_max * 1000, 2),
+            "hash_time_avg_ms": round(self.hash_time_total / completed * 1000, 2),
+            "hash_time_max_ms": round(self.hash_time_max * 1000, 2)
+        }
+
+password_hash_pool = PasswordHashPool(workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password(password: str) -> str:
+    return await password_hash_pool.run(pwd_context.hash, password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
 
-def create_jwt_token(user_id: str) -> str:
-    expiration = datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRATION_DAYS)
+def create_jwt_token(user: User) -> str:
+    """Issue a signed session token carrying the claims get_current_user needs"""
+    now = datetime.now(timezone.utc)
     payload = {
-        "user_id": user_id,
-        "exp": expiration
+        "user_id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "picture": user.picture,
+        "role": user.role,
+        "school_id": user.school_id,
+        "jti": str(uuid.uuid4()),
+        "iat": int(now.timestamp()),
+        "exp": now + timedelta(days=JWT_EXPIRATION_DAYS)
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+def set_session_cookie(response: Response, session_token: str):
+    response.set_cookie(
+        key="session_token",
+        value=session_token,
+        httponly=True,
+        secure=True,
+        samesite="none",
+        max_age=JWT_EXPIRATION_DAYS * 24 * 60 * 60,
+        path="/"
+    )
+
 @api_router.post("/auth/signup")
 async def signup(signup_data: SignupRequest, response: Response):
     # Check if user exists
@@ -448,7 +1492,7 @@ async def signup(signup_data: SignupRequest, response: Response):
     
     # Create user with hashed password
     user_id = str(uuid.uuid4())
-    hashed_pw = hash_password(signup_data.password)
+    hashed_pw = await hash_password(signup_data.password)
     
     user = User(
         id=user_id,
@@ -459,32 +1503,22 @@ async def signup(signup_data: SignupRequest, response: Response):
     )
     
     user_dict = user.model_dump()
-    user_dict["created_at"] = user_dict["created_at"].isoformat()
     user_dict["password_hash"] = hashed_pw
     await db.users.insert_one(user_dict)
     
     # Create session
-    session_token = create_jwt_token(user_id)
+    session_token = create_jwt_token(user)
     expires_at = datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRATION_DAYS)
     
     # Delete any existing sessions for this user (edge case protection)
     await db.user_sessions.delete_many({"user_id": user_id})
+    await session_cache.invalidate_user(user_id)
     
     session = UserSession(user_id=user_id, session_token=session_token, expires_at=expires_at)
     session_dict = session.model_dump()
-    session_dict["expires_at"] = session_dict["expires_at"].isoformat()
-    session_dict["created_at"] = session_dict["created_at"].isoformat()
     await db.user_sessions.insert_one(session_dict)
     
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        max_age=JWT_EXPIRATION_DAYS * 24 * 60 * 60,
-        path="/"
-    )
+    set_session_cookie(response, session_token)
     
     return {"success": True, "user": user, "message": "Account created successfully"}
 
@@ -499,45 +1533,38 @@ async def login(login_data: LoginRequest, response: Response):
     if "password_hash" not in user_doc:
         raise HTTPException(status_code=401, detail="This account uses Google login. Please sign in with Google.")
     
-    if not verify_password(login_data.password, user_doc["password_hash"]):
+    if not await verify_password(login_data.password, user_doc["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    # Remove password hash from response
+    user_doc.pop("password_hash", None)
+    user = User(**user_doc)
+    
     # Create session
-    user_id = user_doc["id"]
-    session_token = create_jwt_token(user_id)
+    user_id = user.id
+    # Stateless tokens have no session row to delete below, so revoke the
+    # ones issued before this login (before minting the new one)
+    if JWT_STATELESS_AUTH:
+        await token_revocations.revoke_user(user_id)
+    session_token = create_jwt_token(user)
     expires_at = datetime.now(timezone.utc) + timedelta(days=JWT_EXPIRATION_DAYS)
     
     # Delete old sessions for this user to prevent duplicate key errors
     await db.user_sessions.delete_many({"user_id": user_id})
+    await session_cache.invalidate_user(user_id)
     
     session = UserSession(user_id=user_id, session_token=session_token, expires_at=expires_at)
     session_dict = session.model_dump()
-    session_dict["expires_at"] = session_dict["expires_at"].isoformat()
-    session_dict["created_at"] = session_dict["created_at"].isoformat()
     await db.user_sessions.insert_one(session_dict)
     
-    response.set_cookie(
-        key="session_token",
-        value=session_token,
-        httponly=True,
-        secure=True,
-        samesite="none",
-        max_age=JWT_EXPIRATION_DAYS * 24 * 60 * 60,
-        path="/"
-    )
-    
-    # Remove password hash from response
-    user_doc.pop("password_hash", None)
-    if isinstance(user_doc["created_at"], str):
-        user_doc["created_at"] = datetime.fromisoformat(user_doc["created_at"])
+    set_session_cookie(response, session_token)
     
-    user = User(**user_doc)
     return {"success": True, "user": user, "message": "Login successful"}
 
 # ==================== SCHOOLS ====================
 
 @api_router.post("/schools", response_model=School)
-async def create_school(school_data: SchoolCreate, current_user: User = Depends(get_current_user)):
+async def create_school(school_data: SchoolCreate, response: Response, current_user: User = Depends(get_current_user)):
     # Check if user already has a school
     existing_school = await db.schools.find_one({"owner_id": current_user.id}, {"_id": 0})
     if existing_school:
@@ -546,29 +1573,38 @@ async def create_school(school_data: SchoolCreate, current_user: User = Depends(
     # Create school with auto-approval
     school = School(**school_data.model_dump(), owner_id=current_user.id, approved=True)
     school_dict = school.model_dump()
-    school_dict["created_at"] = school_dict["created_at"].isoformat()
     await db.schools.insert_one(school_dict)
     
+    await bump_collection_version("schools")
+    
     # Update user role to school and link school_id
     await db.users.update_one({"id": current_user.id}, {"$set": {"role": "school", "school_id": school.id}})
+    await session_cache.invalidate_user(current_user.id)
+    
+    # Stateless tokens carry role/school_id claims - revoke the old ones and reissue so the new role applies immediately
+    if JWT_STATELESS_AUTH:
+        await token_revocations.revoke_user(current_user.id)
+        promoted_user = current_user.model_copy(update={"role": "school", "school_id": school.id})
+        set_session_cookie(response, create_jwt_token(promoted_user))
     return school
 
 @api_router.get("/schools", response_model=List[School])
-async def get_schools(approved_only: bool = True):
+async def get_schools(response: Response, approved_only: bool = True, page: PageParams = Depends(page_params), if_none_match: Optional[str] = Header(None)):
+    not_modified = conditional_response(make_etag(await get_collection_versions("schools")), if_none_match, response)
+    if not_modified:
+        return not_modified
     query = {"approved": True} if approved_only else {}
-    schools = await db.schools.find(query, {"_id": 0}).to_list(1000)
-    for school in schools:
-        if isinstance(school["created_at"], str):
-            school["created_at"] = datetime.fromisoformat(school["created_at"])
-    return schools
+    schools = await find_page(db.schools, query, ["created_at", "id"], page, response, SCHOOL_JSON.projection)
+    return json_response(SCHOOL_JSON.dump_list(schools), response)
 
 @api_router.get("/schools/{school_id}", response_model=School)
-async def get_school(school_id: str):
+async def get_school(school_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    not_modified = conditional_response(make_etag(await get_collection_versions("schools")), if_none_match, response)
+    if not_modified:
+        return not_modified
     school = await db.schools.find_one({"id": school_id}, {"_id": 0})
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
-    if isinstance(school["created_at"], str):
-        school["created_at"] = datetime.fromisoformat(school["created_at"])
     return School(**school)
 
 @api_router.get("/schools/my/school", response_model=School)
@@ -578,8 +1614,6 @@ async def get_my_school(current_user: User = Depends(get_current_user)):
     school = await db.schools.find_one({"owner_id": current_user.id}, {"_id": 0})
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
-    if isinstance(school["created_at"], str):
-        school["created_at"] = datetime.fromisoformat(school["created_at"])
     return School(**school)
 
 @api_router.patch("/schools/{school_id}/approve")
@@ -589,6 +1623,7 @@ async def approve_school(school_id: str, current_user: User = Depends(get_curren
     result = await db.schools.update_one({"id": school_id}, {"$set": {"approved": True}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="School not found")
+    await bump_collection_version("schools")
     return {"success": True}
 
 @api_router.put("/schools/{school_id}", response_model=School)
@@ -613,10 +1648,11 @@ async def update_school(school_id: str, school_data: SchoolUpdate, current_user:
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="School not found")
     
+    catalog_cache.invalidate_school(school_id)
+    await bump_collection_version("schools")
+    
     # Return updated school
     updated_school = await db.schools.find_one({"id": school_id}, {"_id": 0})
-    if isinstance(updated_school["created_at"], str):
-        updated_school["created_at"] = datetime.fromisoformat(updated_school["created_at"])
     return School(**updated_school)
 
 # ==================== LOCATIONS ====================
@@ -627,26 +1663,24 @@ async def create_location(location_data: LocationCreate, current_user: User = De
         raise HTTPException(status_code=403, detail="Only schools can create locations")
     location = Location(**location_data.model_dump(), school_id=current_user.school_id)
     location_dict = location.model_dump()
-    location_dict["created_at"] = location_dict["created_at"].isoformat()
     await db.locations.insert_one(location_dict)
+    await bump_collection_version("locations")
     return location
 
 @api_router.get("/locations", response_model=List[Location])
-async def get_locations(school_id: Optional[str] = None):
+async def get_locations(response: Response, school_id: Optional[str] = None, page: PageParams = Depends(page_params), if_none_match: Optional[str] = Header(None)):
+    not_modified = conditional_response(make_etag(await get_collection_versions("locations")), if_none_match, response)
+    if not_modified:
+        return not_modified
     query = {"school_id": school_id} if school_id else {}
-    locations = await db.locations.find(query, {"_id": 0}).to_list(1000)
-    for loc in locations:
-        if isinstance(loc["created_at"], str):
-            loc["created_at"] = datetime.fromisoformat(loc["created_at"])
-    return locations
+    locations = await find_page(db.locations, query, ["created_at", "id"], page, response, LOCATION_JSON.projection)
+    return json_response(LOCATION_JSON.dump_list(locations), response)
 
 @api_router.get("/locations/{location_id}", response_model=Location)
 async def get_location(location_id: str):
     location = await db.locations.find_one({"id": location_id}, {"_id": 0})
     if not location:
         raise HTTPException(status_code=404, detail="Location not found")
-    if isinstance(location["created_at"], str):
-        location["created_at"] = datetime.fromisoformat(location["created_at"])
     return Location(**location)
 
 @api_router.put("/locations/{location_id}", response_model=Location)
@@ -660,9 +1694,8 @@ async def update_location(location_id: str, location_data: LocationCreate, curre
         raise HTTPException(status_code=403, detail="You can only update your own locations")
     update_dict = location_data.model_dump()
     await db.locations.update_one({"id": location_id}, {"$set": update_dict})
+    await bump_collection_version("locations")
     updated = await db.locations.find_one({"id": location_id}, {"_id": 0})
-    if isinstance(updated["created_at"], str):
-        updated["created_at"] = datetime.fromisoformat(updated["created_at"])
     return Location(**updated)
 
 @api_router.delete("/locations/{location_id}")
@@ -675,6 +1708,7 @@ async def delete_location(location_id: str, current_user: User = Depends(get_cur
     if current_user.role == "school" and existing["school_id"] != current_user.school_id:
         raise HTTPException(status_code=403, detail="You can only delete your own locations")
     await db.locations.delete_one({"id": location_id})
+    await bump_collection_version("locations")
     return {"success": True}
 
 # ==================== INSTRUCTORS ====================
@@ -685,26 +1719,21 @@ async def create_instructor(instructor_data: InstructorCreate, current_user: Use
         raise HTTPException(status_code=403, detail="Only schools can create instructors")
     instructor = Instructor(**instructor_data.model_dump(), school_id=current_user.school_id)
     instructor_dict = instructor.model_dump()
-    instructor_dict["created_at"] = instructor_dict["created_at"].isoformat()
     await db.instructors.insert_one(instructor_dict)
+    await bump_collection_version("instructors")
     return instructor
 
 @api_router.get("/instructors", response_model=List[Instructor])
-async def get_instructors(school_id: Optional[str] = None):
+async def get_instructors(response: Response, school_id: Optional[str] = None, page: PageParams = Depends(page_params)):
     query = {"school_id": school_id} if school_id else {}
-    instructors = await db.instructors.find(query, {"_id": 0}).to_list(1000)
-    for inst in instructors:
-        if isinstance(inst["created_at"], str):
-            inst["created_at"] = datetime.fromisoformat(inst["created_at"])
-    return instructors
+    instructors = await find_page(db.instructors, query, ["created_at", "id"], page, response, INSTRUCTOR_JSON.projection)
+    return json_response(INSTRUCTOR_JSON.dump_list(instructors), response)
 
 @api_router.get("/instructors/{instructor_id}", response_model=Instructor)
 async def get_instructor(instructor_id: str):
     instructor = await db.instructors.find_one({"id": instructor_id}, {"_id": 0})
     if not instructor:
         raise HTTPException(status_code=404, detail="Instructor not found")
-    if isinstance(instructor["created_at"], str):
-        instructor["created_at"] = datetime.fromisoformat(instructor["created_at"])
     return Instructor(**instructor)
 
 @api_router.put("/instructors/{instructor_id}", response_model=Instructor)
@@ -718,9 +1747,8 @@ async def update_instructor(instructor_id: str, instructor_data: InstructorCreat
         raise HTTPException(status_code=403, detail="You can only update your own instructors")
     update_dict = instructor_data.model_dump()
     await db.instructors.update_one({"id": instructor_id}, {"$set": update_dict})
+    await bump_collection_version("instructors")
     updated = await db.instructors.find_one({"id": instructor_id}, {"_id": 0})
-    if isinstance(updated["created_at"], str):
-        updated["created_at"] = datetime.fromisoformat(updated["created_at"])
     return Instructor(**updated)
 
 @api_router.delete("/instructors/{instructor_id}")
@@ -733,6 +1761,7 @@ async def delete_instructor(instructor_id: str, current_user: User = Depends(get
     if current_user.role == "school" and existing["school_id"] != current_user.school_id:
         raise HTTPException(status_code=403, detail="You can only delete your own instructors")
     await db.instructors.delete_one({"id": instructor_id})
+    await bump_collection_version("instructors")
     return {"success": True}
 
 # ==================== COURSES ====================
@@ -752,53 +1781,11 @@ async def create_course(course_data: CourseCreate, current_user: User = Depends(
         raise HTTPException(status_code=400, detail="Invalid instructor for your school")
     
     # LOCATION CAPACITY VALIDATION
-    # Check if course capacity exceeds location capacity
-    if course_data.capacity > location["capacity"]:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Course capacity ({course_data.capacity}) cannot exceed location capacity ({location['capacity']})"
-        )
-    
-    # Check for overlapping courses at the same location
-    # Find all courses at this location that overlap with the new course's dates
-    from datetime import datetime as dt
-    new_start = dt.fromisoformat(course_data.start_date).date()
-    new_end = dt.fromisoformat(course_data.end_date).date()
-    
-    overlapping_courses = await db.courses.find({
-        "location_id": course_data.location_id,
-        "status": {"$in": ["confirmed", "active", "pending_first_approval"]},
-        "$or": [
-            # Course starts during new course
-            {"start_date": {"$lte": course_data.end_date}, "end_date": {"$gte": course_data.start_date}},
-        ]
-    }, {"_id": 0}).to_list(1000)
-    
-    # Calculate total capacity during overlap
-    total_capacity_during_overlap = course_data.capacity
-    overlap_details = []
-    
-    for existing_course in overlapping_courses:
-        total_capacity_during_overlap += existing_course["capacity"]
-        overlap_details.append({
-            "title": existing_course["title"],
-            "dates": f"{existing_course['start_date']} to {existing_course['end_date']}",
-            "capacity": existing_course["capacity"]
-        })
-    
-    # Check if total exceeds location capacity
-    if total_capacity_during_overlap > location["capacity"]:
-        overlap_info = "\n".join([f"- {c['title']} ({c['dates']}): {c['capacity']} students" for c in overlap_details])
-        raise HTTPException(
-            status_code=400,
-            detail=f"Location capacity exceeded. {location['name']} can accommodate {location['capacity']} students maximum.\n\n"
-                   f"Existing courses during {course_data.start_date} to {course_data.end_date}:\n{overlap_info}\n"
-                   f"Total with your course: {total_capacity_during_overlap} students (exceeds {location['capacity']} limit)"
-        )
+    await check_location_capacity(location, course_data)
     
     # Auto-calculate duration from dates if not provided
     if not course_data.duration:
-        delta = new_end - new_start
+        delta = as_date(course_data.end_date) - as_date(course_data.start_date)
         days = delta.days + 1  # Include both start and end days
         if days == 1:
             course_data.duration = "1 day"
@@ -826,12 +1813,14 @@ async def create_course(course_data: CourseCreate, current_user: User = Depends(
     
     course = Course(**course_data.model_dump(), school_id=current_user.school_id, status=course_status)
     course_dict = course.model_dump()
-    course_dict["created_at"] = course_dict["created_at"].isoformat()
     await db.courses.insert_one(course_dict)
+    await location_occupancy.record(None, course_dict)
+    catalog_cache.invalidate_course(course_dict)
+    await bump_collection_version("courses")
     return course
 
 @api_router.get("/courses", response_model=List[Course])
-async def get_courses(school_id: Optional[str] = None, location_id: Optional[str] = None, instructor_id: Optional[str] = None, martial_arts_style: Optional[str] = None, experience_level: Optional[str] = None):
+async def get_courses(response: Response, school_id: Optional[str] = None, location_id: Optional[str] = None, instructor_id: Optional[str] = None, martial_arts_style: Optional[str] = None, experience_level: Optional[str] = None, page: PageParams = Depends(page_params), if_none_match: Optional[str] = Header(None)):
     query = {"status": {"$in": ["confirmed", "active"]}}
     if school_id:
         query["school_id"] = school_id
@@ -844,11 +1833,18 @@ async def get_courses(school_id: Optional[str] = None, location_id: Optional[str
     if experience_level:
         query["experience_level"] = experience_level
     
-    courses = await db.courses.find(query, {"_id": 0}).to_list(1000)
-    for course in courses:
-        if isinstance(course["created_at"], str):
-            course["created_at"] = datetime.fromisoformat(course["created_at"])
-    return courses
+    versions = await get_collection_versions("courses")
+    not_modified = conditional_response(make_etag(versions), if_none_match, response)
+    if not_modified:
+        return not_modified
+    
+    cache_key = CatalogCache.list_key("courses", (school_id, location_id, instructor_id, martial_arts_style, experience_level), page)
+    cached = catalog_cache.get(cache_key, versions, response)
+    if cached:
+        return cached
+    
+    courses = await find_page(db.courses, query, ["created_at", "id"], page, response, COURSE_JSON.projection)
+    return catalog_cache.put(cache_key, versions, COURSE_JSON.dump_list(courses), response)
 
 
 @api_router.get("/debug/db-info")
@@ -1081,7 +2077,7 @@ async def populate_courses_endpoint():
             "name": "Admin",
             "picture": "",
             "role": "admin",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(admin_user)
     
@@ -1100,7 +2096,7 @@ async def populate_courses_endpoint():
             "website": "https://traininjapan.com",
             "logo_url": "https://static.wixstatic.com/media/3ed8bf_67188e03f937488b930fb0a7c9b9a63e~mv2.jpg",
             "approved": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.schools.insert_one(school)
     else:
@@ -1120,7 +2116,7 @@ async def populate_courses_endpoint():
             "capacity": 30,
             "facilities": ["Tatami mats", "Weapon racks", "Changing rooms"],
             "description": "Traditional training hall with authentic Japanese atmosphere.",
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.locations.insert_one(location)
     else:
@@ -1141,7 +2137,7 @@ async def populate_courses_endpoint():
             "bio": "Our team of master instructors brings decades of combined experience.",
             "specialties": ["Koryu Bujutsu", "Modern Budo", "Cultural Arts"],
             "available": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.instructors.insert_one(instructor)
     else:
@@ -1164,12 +2160,18 @@ async def populate_courses_endpoint():
                 "instructor_id": instructor_id,
                 "status": "confirmed",
                 "instructor_confirmed": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_at": datetime.now(timezone.utc),
                 **course_data
             }
             await db.courses.insert_one(course)
+            await location_occupancy.record(None, course)
             created_count += 1
     
+    if created_count:
+        catalog_cache.clear()
+        for collection_name in ("courses", "schools", "locations", "instructors"):
+            await bump_collection_version(collection_name)
+    
     return {
         "success": True,
         "message": f"Created {created_count} courses",
@@ -1256,50 +2258,14 @@ async def update_course(course_id: str, course_data: CourseCreate, current_user:
     if not location:
         raise HTTPException(status_code=400, detail="Invalid location")
     
-    if course_data.capacity > location["capacity"]:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Course capacity ({course_data.capacity}) cannot exceed location capacity ({location['capacity']})"
-        )
-    
-    # Check for overlapping courses (excluding current course being edited)
-    from datetime import datetime as dt
-    new_start = dt.fromisoformat(course_data.start_date).date()
-    new_end = dt.fromisoformat(course_data.end_date).date()
-    
-    overlapping_courses = await db.courses.find({
-        "id": {"$ne": course_id},  # Exclude current course
-        "location_id": course_data.location_id,
-        "status": {"$in": ["confirmed", "active", "pending_first_approval"]},
-        "$or": [
-            {"start_date": {"$lte": course_data.end_date}, "end_date": {"$gte": course_data.start_date}},
-        ]
-    }, {"_id": 0}).to_list(1000)
-    
-    total_capacity_during_overlap = course_data.capacity
-    overlap_details = []
-    
-    for existing_course in overlapping_courses:
-        total_capacity_during_overlap += existing_course["capacity"]
-        overlap_details.append({
-            "title": existing_course["title"],
-            "dates": f"{existing_course['start_date']} to {existing_course['end_date']}",
-            "capacity": existing_course["capacity"]
-        })
-    
-    if total_capacity_during_overlap > location["capacity"]:
-        overlap_info = "\n".join([f"- {c['title']} ({c['dates']}): {c['capacity']} students" for c in overlap_details])
-        raise HTTPException(
-            status_code=400,
-            detail=f"Location capacity exceeded. {location['name']} can accommodate {location['capacity']} students maximum.\n\n"
-                   f"Existing courses during {course_data.start_date} to {course_data.end_date}:\n{overlap_info}\n"
-                   f"Total with your course: {total_capacity_during_overlap} students (exceeds {location['capacity']} limit)"
-        )
+    # Excluding the course being edited
+    await check_location_capacity(location, course_data, exclude_course_id=course_id)
     
     await db.courses.update_one({"id": course_id}, {"$set": course_data.model_dump()})
     updated_course = await db.courses.find_one({"id": course_id}, {"_id": 0})
-    if isinstance(updated_course["created_at"], str):
-        updated_course["created_at"] = datetime.fromisoformat(updated_course["created_at"])
+    await location_occupancy.record(existing, updated_course)
+    catalog_cache.invalidate_course(existing, updated_course)
+    await bump_collection_version("courses")
     return Course(**updated_course)
 
 @api_router.get("/uploads/{filename}")
@@ -1331,6 +2297,9 @@ async def delete_course(course_id: str, current_user: User = Depends(get_current
     if current_user.role == "school" and existing["school_id"] != current_user.school_id:
         raise HTTPException(status_code=403, detail="You can only delete your own courses")
     await db.courses.delete_one({"id": course_id})
+    await location_occupancy.record(existing, None)
+    catalog_cache.invalidate_course(existing)
+    await bump_collection_version("courses")
     return {"success": True}
 
 @api_router.patch("/courses/{course_id}/confirm")
@@ -1342,6 +2311,9 @@ async def confirm_course(course_id: str, current_user: User = Depends(get_curren
     # For MVP: school admin can confirm directly
     if current_user.role == "school" and course["school_id"] == current_user.school_id:
         await db.courses.update_one({"id": course_id}, {"$set": {"instructor_confirmed": True, "status": "confirmed"}})
+        await location_occupancy.record(course, {**course, "instructor_confirmed": True, "status": "confirmed"})
+        catalog_cache.invalidate_course(course)
+        await bump_collection_version("courses")
         return {"success": True}
     
     raise HTTPException(status_code=403, detail="Not authorized")
@@ -1362,12 +2334,65 @@ async def approve_first_course(course_id: str, current_user: User = Depends(get_
     
     # Approve the first course
     await db.courses.update_one({"id": course_id}, {"$set": {"status": "confirmed", "instructor_confirmed": True}})
+    await location_occupancy.record(course, {**course, "status": "confirmed", "instructor_confirmed": True})
+    catalog_cache.invalidate_course(course)
+    await bump_collection_version("courses")
     
     return {"success": True, "message": "First course approved. School can now create courses without approval."}
 
 
 # ==================== BOOKINGS ====================
 
+# Booking statuses that hold one of the course's seats (counted in courses.booked_seats)
+SEAT_HOLDING_STATUSES = ["pending", "confirmed"]
+
+async def reserve_course_seat(course_id: str, session=None) -> bool:
+    """Take a seat only while booked_seats < capacity; False when the course is full"""
+    course = await db.courses.find_one_and_update(
+        {"id": course_id, "$expr": {"$lt": [{"$ifNull": ["$booked_seats", 0]}, "$capacity"]}},
+        {"$inc": {"booked_seats": 1}},
+        projection={"_id": 1},
+        session=session
+    )
+    return course is not None
+
+async def release_course_seat(course_id: str):
+    await db.courses.update_one({"id": course_id, "booked_seats": {"$gt": 0}}, {"$inc": {"booked_seats": -1}})
+
+@job_handler("courses.repair_seats")
+async def repair_seat_counter_job(payload: dict):
+    """Recount a course's seat-holding bookings into booked_seats"""
+    booked = await db.bookings.count_documents({"course_id": payload["course_id"], "status": {"$in": SEAT_HOLDING_STATUSES}})
+    await db.courses.update_one({"id": payload["course_id"]}, {"$set": {"booked_seats": booked}})
+
+async def update_booking_status(booking: dict, updates: dict, enforce_capacity: bool = True) -> bool:
+    """Apply updates (incl. "status") to a booking and move its seat with it.
+
+    The write is conditional on the status the caller read, so of two
+    concurrent transitions only one changes the counter. Returns False if the
+    booking changed in between. Gaining a seat raises 400 when the course is
+    full unless enforce_capacity is off (a payment has already been taken).
+    """
+    held = booking["status"] in SEAT_HOLDING_STATUSES
+    holds = updates.get("status", booking["status"]) in SEAT_HOLDING_STATUSES
+    
+    if holds and not held:
+        if enforce_capacity:
+            if not await reserve_course_seat(booking["course_id"]):
+                raise HTTPException(status_code=400, detail="Course is full")
+        else:
+            await db.courses.update_one({"id": booking["course_id"]}, {"$inc": {"booked_seats": 1}})
+    
+    result = await db.bookings.update_one({"id": booking["id"], "status": booking["status"]}, {"$set": updates})
+    if result.matched_count == 0:
+        if holds and not held:
+            await release_course_seat(booking["course_id"])
+        return False
+    
+    if held and not holds:
+        await release_course_seat(booking["course_id"])
+    return True
+
 @api_router.post("/courses/{course_id}/bookings", response_model=Booking)
 async def create_booking(course_id: str, booking_data: BookingCreate, current_user: User = Depends(get_current_user)):
     course = await db.courses.find_one({"id": course_id}, {"_id": 0})
@@ -1377,44 +2402,354 @@ async def create_booking(course_id: str, booking_data: BookingCreate, current_us
     if course["status"] != "confirmed" and course["status"] != "active":
         raise HTTPException(status_code=400, detail="Course is not available for booking")
     
-    # Check capacity
-    existing_bookings = await db.bookings.count_documents({"course_id": course_id, "status": {"$in": ["pending", "confirmed"]}})
-    if existing_bookings >= course["capacity"]:
+    # Take a seat atomically before inserting; concurrent requests cannot oversell
+    if not await reserve_course_seat(course_id):
         raise HTTPException(status_code=400, detail="Course is full")
     
     booking = Booking(**booking_data.model_dump(), course_id=course_id, user_id=current_user.id, amount_paid=course["price"])
     booking_dict = booking.model_dump()
-    booking_dict["booking_date"] = booking_dict["booking_date"].isoformat()
-    await db.bookings.insert_one(booking_dict)
+    try:
+        await db.bookings.insert_one(booking_dict)
+    except Exception:
+        await release_course_seat(course_id)
+        raise
     return booking
 
 @api_router.get("/bookings", response_model=List[Booking])
-async def get_my_bookings(current_user: User = Depends(get_current_user)):
-    bookings = await db.bookings.find({"user_id": current_user.id}, {"_id": 0}).to_list(1000)
-    for booking in bookings:
-        if isinstance(booking["booking_date"], str):
-            booking["booking_date"] = datetime.fromisoformat(booking["booking_date"])
-    return bookings
+async def get_my_bookings(response: Response, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user)):
+    bookings = await find_page(db.bookings, {"user_id": current_user.id}, ["booking_date", "id"], page, response, BOOKING_JSON.projection)
+    return json_response(BOOKING_JSON.dump_list(bookings), response)
 
 @api_router.get("/schools/{school_id}/bookings", response_model=List[Booking])
-async def get_school_bookings(school_id: str, current_user: User = Depends(get_current_user)):
+async def get_school_bookings(school_id: str, response: Response, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user)):
     if current_user.role == "school" and current_user.school_id != school_id:
         raise HTTPException(status_code=403, detail="You can only view your own school's bookings")
     if current_user.role not in ["school", "admin"]:
         raise HTTPException(status_code=403, detail="Only schools and admins can view bookings")
     
-    courses = await db.courses.find({"school_id": school_id}, {"_id": 0}).to_list(1000)
-    course_ids = [c["id"] for c in courses]
-    bookings = await db.bookings.find({"course_id": {"$in": course_ids}}, {"_id": 0}).to_list(1000)
-    for booking in bookings:
-        if isinstance(booking["booking_date"], str):
-            booking["booking_date"] = datetime.fromisoformat(booking["booking_date"])
-    return bookings
+    course_ids = await db.courses.distinct("id", {"school_id": school_id})
+    bookings = await find_page(db.bookings, {"course_id": {"$in": course_ids}}, ["booking_date", "id"], page, response, BOOKING_JSON.projection)
+    return json_response(BOOKING_JSON.dump_list(bookings), response)
+
+
+
+# ==================== SCHEDULING CONSTRAINTS ====================
+
+# Times of day are compiled to bitmaps of 5-minute slots (bit i = minutes [5i, 5i+5))
+CONSTRAINT_SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // CONSTRAINT_SLOT_MINUTES
+FULL_DAY_MASK = (1 << SLOTS_PER_DAY) - 1
+
+def parse_time_of_day(value: str) -> int:
+    """Minutes since midnight for "HH:MM" ("24:00" is end of day)"""
+    try:
+        hours, minutes = value.split(":")
+        total = int(hours) * 60 + int(minutes)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid time {value!r}, expected HH:MM")
+    if not 0 <= total <= 24 * 60 or not 0 <= int(minutes) < 60:
+        raise HTTPException(status_code=400, detail=f"Invalid time {value!r}, expected HH:MM")
+    return total
+
+def time_mask(start_time: str, end_time: str, inner: bool = False) -> int:
+    """Slots covered by [start_time, end_time).
+
+    By default partially covered slots are included (for sessions and blocked
+    time); inner=True keeps only fully covered ones (for available time), so
+    rounding never makes a session look feasible when it is not.
+    """
+    start, end = parse_time_of_day(start_time), parse_time_of_day(end_time)
+    if inner:
+        first, last = -(-start // CONSTRAINT_SLOT_MINUTES), end // CONSTRAINT_SLOT_MINUTES
+    else:
+        first, last = start // CONSTRAINT_SLOT_MINUTES, -(-end // CONSTRAINT_SLOT_MINUTES)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+def compile_availability(blocks: List[dict]) -> Optional[Dict[int, int]]:
+    """ISO weekday -> available-slot mask; None when the instructor has no availability set (unconstrained).
+
+    Available blocks are unioned (no available blocks at all means available
+    all day), then unavailable blocks are cut out.
+    """
+    if not blocks:
+        return None
+    has_available = any(block.get("is_available", True) for block in blocks)
+    week = {day: 0 if has_available else FULL_DAY_MASK for day in range(1, 8)}
+    for block in blocks:
+        if block.get("is_available", True) and block["day_of_week"] in week:
+            week[block["day_of_week"]] |= time_mask(block["start_time"], block["end_time"], inner=True)
+    for block in blocks:
+        if not block.get("is_available", True) and block["day_of_week"] in week:
+            week[block["day_of_week"]] &= ~time_mask(block["start_time"], block["end_time"])
+    return week
+
+def compile_calendar_blocks(blocks: List[dict]) -> Dict[str, List[Tuple[int, str]]]:
+    """ISO date -> [(blocked-slot mask, reason)] for every day a location block covers"""
+    days: Dict[str, List[Tuple[int, str]]] = {}
+    for block in blocks:
+        mask = time_mask(block["start_time"], block["end_time"])
+        day, last = as_date(block["start_date"]), as_date(block["end_date"])
+        while day <= last:
+            days.setdefault(day.isoformat(), []).append((mask, block["reason"]))
+            day += timedelta(days=1)
+    return days
+
+class SchedulingConstraints:
+    """Cached availability/blocked-time bitmaps per instructor and location.
+
+    Entries are validated against "availability:<instructor_id>" and
+    "calendar_blocks:<location_id>" counters in collection_versions, bumped by
+    the endpoints that change them, so every worker sees edits immediately.
+    A schedule's occurrences are then checked with one AND per date.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._instructors = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locations = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def availability_key(instructor_id: str) -> str:
+        return f"availability:{instructor_id}"
+
+    @staticmethod
+    def blocks_key(location_id: str) -> str:
+        return f"calendar_blocks:{location_id}"
+
+    async def _cached(self, cache: TTLCache, entity_id: str, version: int, load):
+        entry = cache.get(entity_id)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        compiled = await load()
+        cache[entity_id] = (version, compiled)
+        return compiled
+
+    async def _load_availability(self, instructor_id: str):
+        blocks = await db.instructor_availability.find({"instructor_id": instructor_id}, {"_id": 0}).to_list(None)
+        return compile_availability(blocks)
+
+    async def _load_blocks(self, location_id: str):
+        blocks = await db.location_calendar_blocks.find({"location_id": location_id}, {"_id": 0}).to_list(None)
+        return compile_calendar_blocks(blocks)
+
+    async def compiled(self, location_id: Optional[str], instructor_id: Optional[str]):
+        """(instructor weekly availability or None, location blocks by date) for the given ids"""
+        keys = ([self.availability_key(instructor_id)] if instructor_id else []) + ([self.blocks_key(location_id)] if location_id else [])
+        if not keys:
+            return None, {}
+        versions = await get_collection_versions(*keys)
+        week, blocked = await asyncio.gather(
+            self._cached(self._instructors, instructor_id, versions[keys[0]], lambda: self._load_availability(instructor_id)) if instructor_id else asyncio.sleep(0),
+            self._cached(self._locations, location_id, versions[keys[-1]], lambda: self._load_blocks(location_id)) if location_id else asyncio.sleep(0)
+        )
+        return week, blocked or {}
+
+    async def violations(self, location_id: Optional[str], instructor_id: Optional[str], dates: List[str], start_time: str, end_time: str) -> List[dict]:
+        """Occurrences that fall outside the instructor's availability or inside a location block"""
+        if not dates or not (location_id or instructor_id):
+            return []
+        week, blocked = await self.compiled(location_id, instructor_id)
+        return self.check(week, blocked, dates, start_time, end_time)
+
+    @staticmethod
+    def check(week: Optional[Dict[int, int]], blocked: dict, dates: List[str], start_time: str, end_time: str) -> List[dict]:
+        """violations() against bitmaps already returned by compiled(), with no database work"""
+        session = time_mask(start_time, end_time)
+        violations = []
+        for day in dates:
+            if week is not None and session & ~week[as_date(day).isoweekday()]:
+                violations.append({"date": day, "type": "instructor_unavailable"})
+            for mask, reason in blocked.get(day, []):
+                if session & mask:
+                    violations.append({"date": day, "type": "location_blocked", "reason": reason})
+                    break
+        return violations
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "instructors": len(self._instructors),
+            "locations": len(self._locations)
+        }
 
+scheduling_constraints = SchedulingConstraints(maxsize=CONSTRAINT_CACHE_MAX_ENTRIES, ttl=CONSTRAINT_CACHE_TTL_SECONDS)
 
+async def check_schedule_constraints(location_id: str, instructor_id: str, schedule: ScheduleCreate):
+    """Raise 400 listing the occurrences the instructor cannot teach or the location is blocked for"""
+    if parse_time_of_day(schedule.end_time) <= parse_time_of_day(schedule.start_time):
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    violations = await scheduling_constraints.violations(
+        location_id, instructor_id, schedule_dates(schedule), schedule.start_time, schedule.end_time
+    )
+    if violations:
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"{len(violations)} session(s) conflict with instructor availability or location blocks", "violations": violations}
+        )
 
 # ==================== SCHEDULING ====================
 
+def expand_recurrence(start: date, end: date, recurrence_type: str, recurrence_days: List[int], recurrence_interval: int = 1) -> List[date]:
+    """Dates a schedule occurs on, computed arithmetically instead of walking every day.
+
+    once: start only. daily: every day. weekly: each ISO weekday in
+    recurrence_days (1=Mon..7=Sun). custom: every recurrence_interval days.
+    """
+    if end < start:
+        return []
+    span = (end - start).days + 1
+    if recurrence_type == "once":
+        offsets = [0]
+    elif recurrence_type == "daily":
+        offsets = range(span)
+    elif recurrence_type == "custom":
+        offsets = range(0, span, max(recurrence_interval, 1))
+    elif recurrence_type == "weekly":
+        first_weekday = start.isoweekday()
+        offsets = sorted(
+            offset
+            for weekday in set(recurrence_days)
+            if 1 <= weekday <= 7  # schedules stored before recurrence_days was validated
+            for offset in range((weekday - first_weekday) % 7, span, 7)
+        )
+    else:
+        return []
+    return [start + timedelta(days=offset) for offset in offsets]
+
+def build_session_docs(course: dict, schedule: dict) -> List[dict]:
+    """course_sessions documents for every occurrence of a schedule"""
+    dates = expand_recurrence(
+        as_date(schedule["start_date"]), as_date(schedule["end_date"]),
+        schedule["recurrence_type"], schedule.get("recurrence_days", []), schedule.get("recurrence_interval", 1)
+    )
+    if not dates:
+        return []
+    # Validate the shared fields once and stamp out one copy per date
+    template = CourseSession(
+        course_id=course["id"],
+        schedule_id=schedule["id"],
+        date=dates[0].isoformat(),
+        start_time=schedule["start_time"],
+        end_time=schedule["end_time"],
+        location_id=course["location_id"],
+        instructor_id=course["instructor_id"],
+        max_capacity=course["capacity"]
+    ).model_dump()
+    return [{**template, "id": str(uuid.uuid4()), "date": day.isoformat()} for day in dates]
+
+# Virtual sessions have deterministic ids, so a session keeps its id when it is materialized
+def virtual_session_id(schedule_id: str, day: date) -> str:
+    return f"{schedule_id}@{day.isoformat()}"
+
+def split_virtual_session_id(session_id: str) -> Optional[Tuple[str, date]]:
+    schedule_id, separator, day = session_id.rpartition("@")
+    if not separator:
+        return None
+    try:
+        return schedule_id, date.fromisoformat(day)
+    except ValueError:
+        return None
+
+def expand_virtual_sessions(schedule: dict, from_date: Optional[str] = None, to_date: Optional[str] = None) -> List[dict]:
+    """Session documents for a virtual schedule's occurrences within [from_date, to_date]"""
+    dates = expand_recurrence(
+        as_date(schedule["start_date"]), as_date(schedule["end_date"]),
+        schedule["recurrence_type"], schedule.get("recurrence_days", []), schedule.get("recurrence_interval", 1)
+    )
+    return [{
+        "id": virtual_session_id(schedule["id"], day),
+        "course_id": schedule["course_id"],
+        "schedule_id": schedule["id"],
+        "date": day.isoformat(),
+        "start_time": schedule["start_time"],
+        "end_time": schedule["end_time"],
+        "location_id": schedule["location_id"],
+        "instructor_id": schedule["instructor_id"],
+        "max_capacity": schedule["max_capacity"],
+        "current_enrollment": 0,
+        "status": "scheduled",
+        "created_at": schedule["created_at"],
+        "virtual": True
+    } for day in dates if (not from_date or day.isoformat() >= from_date) and (not to_date or day.isoformat() <= to_date)]
+
+async def unmaterialized_sessions(schedule_query: dict, from_date: Optional[str] = None, to_date: Optional[str] = None) -> List[dict]:
+    """Occurrences of matching virtual schedules that have no course_sessions document yet.
+
+    Callers combine these with a normal course_sessions query, which already
+    returns the occurrences that have been materialized.
+    """
+    query = {**schedule_query, "virtual": True}
+    if to_date:
+        query["start_date"] = {"$lte": to_date}
+    if from_date:
+        query["end_date"] = {"$gte": from_date}
+    schedules = await db.course_schedules.find(query, {"_id": 0}).to_list(None)
+    if not schedules:
+        return []
+    
+    materialized_query = {"schedule_id": {"$in": [schedule["id"] for schedule in schedules]}}
+    if from_date or to_date:
+        materialized_query["date"] = {**({"$gte": from_date} if from_date else {}), **({"$lte": to_date} if to_date else {})}
+    materialized = set(await db.course_sessions.distinct("id", materialized_query))
+    return [
+        session
+        for schedule in schedules
+        for session in expand_virtual_sessions(schedule, from_date, to_date)
+        if session["id"] not in materialized
+    ]
+
+async def materialize_sessions(session_ids: List[str]) -> Dict[str, dict]:
+    """Stored documents for session_ids, writing virtual occurrences to course_sessions first.
+
+    Call this before attaching state (bookings, cancellations, capacity
+    overrides) to a session. Unknown ids are left out of the result.
+    """
+    sessions = {
+        session["id"]: session
+        for session in await db.course_sessions.find({"id": {"$in": session_ids}}, {"_id": 0}).to_list(len(session_ids))
+    }
+    missing = {}
+    for session_id in session_ids:
+        parsed = split_virtual_session_id(session_id) if session_id not in sessions else None
+        if parsed:
+            missing[session_id] = parsed
+    if not missing:
+        return sessions
+    
+    schedule_ids = list({schedule_id for schedule_id, _ in missing.values()})
+    schedules = {
+        schedule["id"]: schedule
+        for schedule in await db.course_schedules.find({"id": {"$in": schedule_ids}, "virtual": True}, {"_id": 0}).to_list(len(schedule_ids))
+    }
+    operations = []
+    for session_id, (schedule_id, day) in missing.items():
+        schedule = schedules.get(schedule_id)
+        occurrences = expand_virtual_sessions(schedule, day.isoformat(), day.isoformat()) if schedule else []
+        if occurrences:
+            session = {**occurrences[0], "created_at": datetime.now(timezone.utc)}
+            session.pop("virtual")
+            operations.append(UpdateOne({"id": session_id}, {"$setOnInsert": session}, upsert=True))
+    if not operations:
+        return sessions
+    
+    try:
+        await db.course_sessions.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Another request materialized the same session first
+        if any(error["code"] != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    created = await db.course_sessions.find({"id": {"$in": list(missing)}}, {"_id": 0}).to_list(len(missing))
+    sessions.update({session["id"]: session for session in created})
+    return sessions
+
 @api_router.post("/courses/{course_id}/schedules")
 async def create_course_schedule(
     course_id: str,
@@ -1435,63 +2770,145 @@ async def create_course_schedule(
         if not school or school["id"] != course["school_id"]:
             raise HTTPException(status_code=403, detail="You don't own this course")
     
+    if schedule_data.recurrence_type == "custom" and schedule_data.recurrence_interval < 1:
+        raise HTTPException(status_code=400, detail="recurrence_interval must be at least 1")
+    await check_schedule_constraints(course["location_id"], course["instructor_id"], schedule_data)
+    
     # Create schedule
     schedule = CourseSchedule(
         course_id=course_id,
         **schedule_data.model_dump()
     )
+    if VIRTUAL_SESSIONS:
+        schedule.virtual = True
+        schedule.location_id = course["location_id"]
+        schedule.instructor_id = course["instructor_id"]
+        schedule.max_capacity = course["capacity"]
     schedule_dict = schedule.model_dump()
-    schedule_dict["created_at"] = schedule_dict["created_at"].isoformat()
     await db.course_schedules.insert_one(schedule_dict)
+    await bump_collection_version("course_sessions")
+    
+    if schedule.virtual:
+        session_ids = [session["id"] for session in expand_virtual_sessions(schedule_dict)]
+        return {
+            "success": True,
+            "schedule_id": schedule.id,
+            "sessions_created": len(session_ids),
+            "session_ids": session_ids
+        }
     
     # Generate sessions based on schedule
-    from datetime import datetime, timedelta
-    from datetime import time as datetime_time
+    session_docs = build_session_docs(course, schedule_dict)
+    if session_docs:
+        await db.course_sessions.insert_many(session_docs, ordered=True)
+    session_ids = [session["id"] for session in session_docs]
+    
+    return {
+        "success": True,
+        "schedule_id": schedule.id,
+        "sessions_created": len(session_ids),
+        "session_ids": session_ids
+    }
+
+@api_router.put("/schedules/{schedule_id}")
+async def update_course_schedule(
+    schedule_id: str,
+    schedule_data: ScheduleCreate,
+    current_user: User = Depends(get_current_user)
+):
+    """Change a schedule's recurrence, touching only the sessions that differ.
+
+    Dates that are new get sessions, dates that dropped out are cancelled
+    (bookings and enrollment stay on them), and sessions on dates in both
+    keep their id and enrollment with the times updated in place. Sessions
+    cancelled by an earlier edit come back if their date returns.
+    """
+    if current_user.role not in ["school", "admin"]:
+        raise HTTPException(status_code=403, detail="Only schools can update schedules")
     
-    start_date = datetime.fromisoformat(schedule_data.start_date).date()
-    end_date = datetime.fromisoformat(schedule_data.end_date).date()
+    schedule = await db.course_schedules.find_one({"id": schedule_id}, {"_id": 0})
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    course = await db.courses.find_one({"id": schedule["course_id"]}, {"_id": 0})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if current_user.role == "school" and current_user.school_id != course["school_id"]:
+        raise HTTPException(status_code=403, detail="You don't own this course")
+    if schedule_data.recurrence_type == "custom" and schedule_data.recurrence_interval < 1:
+        raise HTTPException(status_code=400, detail="recurrence_interval must be at least 1")
+    location_id = schedule.get("location_id") or course["location_id"]
+    instructor_id = schedule.get("instructor_id") or course["instructor_id"]
+    await check_schedule_constraints(location_id, instructor_id, schedule_data)
+    
+    updated = {**schedule, **schedule_data.model_dump()}
+    new_dates = {
+        day.isoformat() for day in expand_recurrence(
+            as_date(updated["start_date"]), as_date(updated["end_date"]),
+            updated["recurrence_type"], updated["recurrence_days"], updated["recurrence_interval"]
+        )
+    }
     
-    sessions_created = []
-    current_date = start_date
+    # Every session of the edited schedule must be free of other schedules' sessions
+    checked_dates = sorted(new_dates)
+    location_sessions, instructor_sessions = await asyncio.gather(
+        find_session_conflicts("location_id", location_id, checked_dates, updated["start_time"], updated["end_time"], schedule_id),
+        find_session_conflicts("instructor_id", instructor_id, checked_dates, updated["start_time"], updated["end_time"], schedule_id)
+    )
+    if location_sessions or instructor_sessions:
+        raise HTTPException(status_code=400, detail={
+            "message": "The updated schedule overlaps existing sessions at this location or with this instructor",
+            **conflict_report(checked_dates, location_sessions, instructor_sessions, [])
+        })
+    stored = await db.course_sessions.find(
+        {"schedule_id": schedule_id},
+        {"_id": 0, "date": 1, "status": 1, "current_enrollment": 1, "cancelled_by_schedule": 1}
+    ).to_list(None)
+    stored_dates = {session["date"] for session in stored}
+    
+    removed = [session for session in stored if session["date"] not in new_dates and session["status"] == "scheduled"]
+    restored = [session["date"] for session in stored if session["date"] in new_dates and session.get("cancelled_by_schedule")]
+    kept = sorted(stored_dates & new_dates)
+    # Virtual schedules keep expanding on read; only stored sessions are diffed
+    added = [] if schedule.get("virtual") else [
+        session for session in build_session_docs(course, updated) if session["date"] not in stored_dates
+    ]
     
-    while current_date <= end_date:
-        should_create_session = False
-        
-        if schedule_data.recurrence_type == "once":
-            should_create_session = (current_date == start_date)
-        elif schedule_data.recurrence_type == "daily":
-            should_create_session = True
-        elif schedule_data.recurrence_type == "weekly":
-            # Check if current day is in recurrence_days
-            day_of_week = current_date.isoweekday()  # 1=Monday, 7=Sunday
-            should_create_session = day_of_week in schedule_data.recurrence_days
-        elif schedule_data.recurrence_type == "custom":
-            days_diff = (current_date - start_date).days
-            should_create_session = (days_diff % schedule_data.recurrence_interval == 0)
-        
-        if should_create_session:
-            session = CourseSession(
-                course_id=course_id,
-                schedule_id=schedule.id,
-                date=current_date.isoformat(),
-                start_time=schedule_data.start_time,
-                end_time=schedule_data.end_time,
-                location_id=course["location_id"],
-                instructor_id=course["instructor_id"],
-                max_capacity=course["capacity"]
-            )
-            session_dict = session.model_dump()
-            session_dict["created_at"] = session_dict["created_at"].isoformat()
-            await db.course_sessions.insert_one(session_dict)
-            sessions_created.append(session.id)
-        
-        current_date += timedelta(days=1)
+    operations = [InsertOne(session) for session in added]
+    if removed:
+        operations.append(UpdateMany(
+            {"schedule_id": schedule_id, "date": {"$in": [session["date"] for session in removed]}, "status": "scheduled"},
+            {"$set": {"status": "cancelled", "cancelled_by_schedule": True}}
+        ))
+    if restored:
+        operations.append(UpdateMany(
+            {"schedule_id": schedule_id, "date": {"$in": restored}, "cancelled_by_schedule": True},
+            {"$set": {"status": "scheduled"}, "$unset": {"cancelled_by_schedule": ""}}
+        ))
+    if kept and (updated["start_time"], updated["end_time"]) != (schedule["start_time"], schedule["end_time"]):
+        operations.append(UpdateMany(
+            {"schedule_id": schedule_id, "date": {"$in": kept}},
+            {"$set": {"start_time": updated["start_time"], "end_time": updated["end_time"]}}
+        ))
+    
+    # Sessions and the schedule change together; without transactions the schedule is written last
+    async def write(session=None):
+        if operations:
+            await db.course_sessions.bulk_write(operations, ordered=True, session=session)
+        await db.course_schedules.update_one({"id": schedule_id}, {"$set": schedule_data.model_dump()}, session=session)
+    
+    in_transaction, _ = await run_in_transaction(write)
+    if not in_transaction:
+        await write()
+    await bump_collection_version("course_sessions")
     
     return {
         "success": True,
-        "schedule_id": schedule.id,
-        "sessions_created": len(sessions_created),
-        "session_ids": sessions_created
+        "schedule_id": schedule_id,
+        "sessions_added": len(added),
+        "sessions_cancelled": len(removed),
+        "sessions_restored": len(restored),
+        "sessions_kept": len(kept) - len(restored),
+        "cancelled_with_enrollment": sum(1 for session in removed if session.get("current_enrollment", 0) > 0)
     }
 
 @api_router.get("/courses/{course_id}/schedules")
@@ -1501,22 +2918,60 @@ async def get_course_schedules(course_id: str):
     return schedules
 
 @api_router.get("/courses/{course_id}/sessions")
-async def get_course_sessions(course_id: str, status: Optional[str] = None):
-    """Get all sessions for a course"""
+async def get_course_sessions(
+    course_id: str,
+    response: Response,
+    status: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    page: PageParams = Depends(page_params)
+):
+    """Get sessions for a course in date order (optionally within [from_date, to_date])"""
+    sort_fields = ["date", "start_time", "id"]
     query = {"course_id": course_id}
     if status:
         query["status"] = status
-    
-    sessions = await db.course_sessions.find(query, {"_id": 0}).to_list(1000)
+    if from_date or to_date:
+        query["date"] = {**({"$gte": from_date} if from_date else {}), **({"$lte": to_date} if to_date else {})}
+    
+    virtual = []
+    if status in (None, "scheduled"):
+        virtual = await unmaterialized_sessions({"course_id": course_id}, from_date, to_date)
+    if not virtual:
+        return await find_page(db.course_sessions, query, sort_fields, page, response)
+    
+    # Merge the stored page with the virtual occurrences that sort after the cursor.
+    # Every stored session up to the page's last one is in `stored`, so the first
+    # page.limit merged entries are exact.
+    stored_response = Response()
+    stored = await find_page(db.course_sessions, query, sort_fields, page, stored_response)
+    sort_key = lambda session: tuple(session[field] for field in sort_fields)
+    if page.cursor:
+        after = tuple(decode_cursor(page.cursor, len(sort_fields)))
+        virtual = [session for session in virtual if sort_key(session) > after]
+    merged = sorted(stored + virtual, key=sort_key)
+    sessions = merged[:page.limit]
+    if sessions and (len(merged) > page.limit or "X-Next-Cursor" in stored_response.headers):
+        response.headers["X-Next-Cursor"] = encode_cursor(list(sort_key(sessions[-1])))
     return sessions
 
 @api_router.get("/sessions/{session_id}")
 async def get_session(session_id: str):
     """Get a specific session"""
     session = await db.course_sessions.find_one({"id": session_id}, {"_id": 0})
-    if not session:
-        raise HTTPException(status_code=404, detail="Session not found")
-    return session
+    if session:
+        return session
+    
+    # Not stored yet: expand it from its virtual schedule
+    parsed = split_virtual_session_id(session_id)
+    if parsed:
+        schedule_id, day = parsed
+        schedule = await db.course_schedules.find_one({"id": schedule_id, "virtual": True}, {"_id": 0})
+        if schedule:
+            occurrences = expand_virtual_sessions(schedule, day.isoformat(), day.isoformat())
+            if occurrences:
+                return occurrences[0]
+    raise HTTPException(status_code=404, detail="Session not found")
 
 @api_router.patch("/sessions/{session_id}")
 async def update_session(
@@ -1530,6 +2985,10 @@ async def update_session(
     
     update_dict = {k: v for k, v in update_data.model_dump().items() if v is not None}
     
+    # A cancellation or capacity override is state, so a virtual session gets stored first
+    if not await materialize_sessions([session_id]):
+        raise HTTPException(status_code=404, detail="Session not found")
+    
     result = await db.course_sessions.update_one(
         {"id": session_id},
         {"$set": update_dict}
@@ -1537,6 +2996,7 @@ async def update_session(
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Session not found")
+    await bump_collection_version("course_sessions")
     
     return {"success": True}
 
@@ -1554,6 +3014,7 @@ async def delete_schedule(
     
     # Delete the schedule
     result = await db.course_schedules.delete_one({"id": schedule_id})
+    await bump_collection_version("course_sessions")
     
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Schedule not found")
@@ -1562,62 +3023,555 @@ async def delete_schedule(
 
 # ==================== CONFLICT CHECKING ====================
 
+async def find_session_conflicts(
+    field: str,
+    value: str,
+    dates: List[str],
+    start_time: str,
+    end_time: str,
+    exclude_schedule_id: Optional[str] = None
+) -> List[dict]:
+    """Scheduled sessions with field == value on any of dates whose time overlaps [start_time, end_time).
+
+    The overlap test runs in the query, served by the
+    (location_id|instructor_id, date, status, start_time, end_time) indexes,
+    so only actual conflicts come back.
+    """
+    if not dates:
+        return []
+    query = {
+        field: value,
+        "date": {"$in": dates},
+        "status": "scheduled",
+        "start_time": {"$lt": end_time},
+        "end_time": {"$gt": start_time}
+    }
+    if exclude_schedule_id:
+        query["schedule_id"] = {"$ne": exclude_schedule_id}
+    sessions = await db.course_sessions.find(
+        query, {"_id": 0, "id": 1, "schedule_id": 1, "date": 1, "start_time": 1, "end_time": 1}
+    ).sort([("date", 1), ("start_time", 1)]).to_list(None)
+    
+    date_set = set(dates)
+    sessions += [
+        session for session in await unmaterialized_sessions({field: value}, dates[0], dates[-1])
+        if session["date"] in date_set and session["start_time"] < end_time and session["end_time"] > start_time
+        and session["schedule_id"] != exclude_schedule_id
+    ]
+    return sorted(sessions, key=lambda session: (session["date"], session["start_time"]))
+
+class SessionIntervalIndex:
+    """Sessions grouped by date and sorted by start time, for answering many overlap queries in memory"""
+
+    def __init__(self, sessions: List[dict]):
+        self._days: Dict[str, Tuple[List[str], List[dict]]] = {}
+        for session in sorted(sessions, key=lambda session: (session["date"], session["start_time"])):
+            starts, day_sessions = self._days.setdefault(session["date"], ([], []))
+            starts.append(session["start_time"])
+            day_sessions.append(session)
+
+    def overlapping(self, day: str, start_time: str, end_time: str) -> List[dict]:
+        if day not in self._days:
+            return []
+        starts, day_sessions = self._days[day]
+        # Only sessions starting before end_time can overlap; of those keep the ones ending after start_time
+        return [session for session in day_sessions[:bisect.bisect_left(starts, end_time)] if session["end_time"] > start_time]
+
+async def resolve_conflict_resources(course_id: Optional[str], location_id: Optional[str], instructor_id: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Location/instructor to check, defaulting to the course's"""
+    if course_id and not (location_id and instructor_id):
+        course = await db.courses.find_one({"id": course_id}, {"_id": 0, "location_id": 1, "instructor_id": 1})
+        if not course:
+            raise HTTPException(status_code=404, detail="Course not found")
+        location_id = location_id or course["location_id"]
+        instructor_id = instructor_id or course["instructor_id"]
+    return location_id, instructor_id
+
+def schedule_dates(schedule: ScheduleCreate) -> List[str]:
+    try:
+        first_day, last_day = as_date(schedule.start_date), as_date(schedule.end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    return [
+        day.isoformat() for day in expand_recurrence(
+            first_day, last_day,
+            schedule.recurrence_type, schedule.recurrence_days, schedule.recurrence_interval
+        )
+    ]
+
+def conflict_report(dates: List[str], location_sessions: List[dict], instructor_sessions: List[dict], violations: List[dict]) -> dict:
+    def compact(session: dict) -> dict:
+        return {"session_id": session["id"], "date": session["date"], "time": f"{session['start_time']}-{session['end_time']}"}
+    
+    by_date: Dict[str, dict] = {}
+    for kind, sessions in (("location", location_sessions), ("instructor", instructor_sessions)):
+        for session in sessions:
+            by_date.setdefault(session["date"], {"date": session["date"], "location": [], "instructor": []})[kind].append(
+                f"{session['start_time']}-{session['end_time']}"
+            )
+    
+    return {
+        "has_conflict": bool(location_sessions or instructor_sessions or violations),
+        "occurrences_checked": len(dates),
+        "constraint_violations": violations,
+        "conflict_dates": [by_date[day] for day in sorted(by_date)],
+        "location_conflicts": [compact(session) for session in location_sessions],
+        "instructor_conflicts": [compact(session) for session in instructor_sessions]
+    }
+
 @api_router.post("/validate-schedule")
-async def validate_schedule(request: dict):
-    """Check for scheduling conflicts"""
-    location_id = request.get("location_id")
-    instructor_id = request.get("instructor_id")
-    start_date = request.get("start_date")
-    end_date = request.get("end_date")
-    start_time = request.get("start_time")
-    end_time = request.get("end_time")
-    
-    conflicts = {
-        "has_conflict": False,
-        "location_conflicts": [],
-        "instructor_conflicts": []
+async def validate_schedule(check: ScheduleConflictCheck):
+    """Check a schedule's occurrences for location and instructor conflicts"""
+    location_id, instructor_id = await resolve_conflict_resources(check.course_id, check.location_id, check.instructor_id)
+    dates = schedule_dates(check)
+    
+    async def conflicts_for(field: str, value: Optional[str]) -> List[dict]:
+        if not value:
+            return []
+        return await find_session_conflicts(field, value, dates, check.start_time, check.end_time, check.exclude_schedule_id)
+    
+    location_sessions, instructor_sessions, violations = await asyncio.gather(
+        conflicts_for("location_id", location_id),
+        conflicts_for("instructor_id", instructor_id),
+        scheduling_constraints.violations(location_id, instructor_id, dates, check.start_time, check.end_time)
+    )
+    return conflict_report(dates, location_sessions, instructor_sessions, violations)
+
+# Upper bound on candidate slots per batch request
+MAX_CONFLICT_CANDIDATES = 200
+
+@api_router.post("/validate-schedule/batch")
+async def validate_schedule_batch(check: BatchConflictCheck):
+    """Check many candidate schedules against the same location/instructor in one call.
+
+    The sessions for every candidate date are loaded once per resource and
+    indexed in memory; each candidate is then answered from the index.
+    Results come back in candidate order, shaped like /validate-schedule.
+    """
+    if len(check.candidates) > MAX_CONFLICT_CANDIDATES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_CONFLICT_CANDIDATES} candidates per request")
+    location_id, instructor_id = await resolve_conflict_resources(check.course_id, check.location_id, check.instructor_id)
+    
+    candidate_dates = [schedule_dates(candidate) for candidate in check.candidates]
+    all_dates = sorted({day for dates in candidate_dates for day in dates})
+    
+    async def load_index(field: str, value: Optional[str]) -> SessionIntervalIndex:
+        if not value or not all_dates:
+            return SessionIntervalIndex([])
+        query = {field: value, "date": {"$in": all_dates}, "status": "scheduled"}
+        if check.exclude_schedule_id:
+            query["schedule_id"] = {"$ne": check.exclude_schedule_id}
+        sessions = await db.course_sessions.find(
+            query, {"_id": 0, "id": 1, "schedule_id": 1, "date": 1, "start_time": 1, "end_time": 1}
+        ).to_list(None)
+        date_set = set(all_dates)
+        sessions += [
+            session for session in await unmaterialized_sessions({field: value}, all_dates[0], all_dates[-1])
+            if session["date"] in date_set and session["schedule_id"] != check.exclude_schedule_id
+        ]
+        return SessionIntervalIndex(sessions)
+    
+    location_index, instructor_index, (week, blocked) = await asyncio.gather(
+        load_index("location_id", location_id),
+        load_index("instructor_id", instructor_id),
+        scheduling_constraints.compiled(location_id, instructor_id)
+    )
+    
+    results = []
+    for position, (candidate, dates) in enumerate(zip(check.candidates, candidate_dates)):
+        location_sessions = [session for day in dates for session in location_index.overlapping(day, candidate.start_time, candidate.end_time)]
+        instructor_sessions = [session for day in dates for session in instructor_index.overlapping(day, candidate.start_time, candidate.end_time)]
+        violations = SchedulingConstraints.check(week, blocked, dates, candidate.start_time, candidate.end_time) if dates else []
+        results.append({"index": position, **conflict_report(dates, location_sessions, instructor_sessions, violations)})
+    return {"results": results}
+
+# ==================== SLOT FINDER ====================
+
+def minutes_to_time(total: int) -> str:
+    return f"{total // 60:02d}:{total % 60:02d}"
+
+def weekday_spread(days: Tuple[int, ...]) -> int:
+    """Smallest gap in days between consecutive chosen weekdays, wrapping round the week"""
+    if len(days) < 2:
+        return 7
+    return min((days[(i + 1) % len(days)] - days[i]) % 7 or 7 for i in range(len(days)))
+
+@api_router.post("/courses/{course_id}/slot-options")
+async def find_slot_options(course_id: str, search: SlotSearch, current_user: User = Depends(get_current_user)):
+    """Propose weekly schedules for a course that are free at its location and for its instructor.
+
+    Everything the search needs is loaded once and compiled into 5-minute
+    slot bitmaps: per date, the union of existing location and instructor
+    sessions and location blocks; per weekday, the instructor's availability.
+    Each (weekday, start time) pair is then tested with one AND per date, and
+    conflict-free weekday combinations are ranked by how evenly they spread
+    over the week and how close they start to the preferred time.
+    """
+    if current_user.role not in ["school", "admin"]:
+        raise HTTPException(status_code=403, detail="Only schools can plan schedules")
+    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    if current_user.role == "school" and course["school_id"] != current_user.school_id:
+        raise HTTPException(status_code=403, detail="You don't own this course")
+    
+    try:
+        first_day, last_day = as_date(search.start_date), as_date(search.end_date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if last_day < first_day or (last_day - first_day).days > 366 * 2:
+        raise HTTPException(status_code=400, detail="Date range must be forwards and at most two years")
+    earliest, latest = parse_time_of_day(search.earliest_start), parse_time_of_day(search.latest_end)
+    preferred = parse_time_of_day(search.preferred_start or course.get("daily_start_time") or search.earliest_start)
+    
+    location_id, instructor_id = course["location_id"], course["instructor_id"]
+    sessions, virtual_location, virtual_instructor, (week, blocked) = await asyncio.gather(
+        db.course_sessions.find(
+            {"$or": [{"location_id": location_id}, {"instructor_id": instructor_id}],
+             "date": {"$gte": search.start_date, "$lte": search.end_date}, "status": "scheduled"},
+            {"_id": 0, "date": 1, "start_time": 1, "end_time": 1}
+        ).to_list(None),
+        unmaterialized_sessions({"location_id": location_id}, search.start_date, search.end_date),
+        unmaterialized_sessions({"instructor_id": instructor_id}, search.start_date, search.end_date),
+        scheduling_constraints.compiled(location_id, instructor_id)
+    )
+    
+    # Busy slots per date, grouped by weekday
+    busy: Dict[str, int] = {}
+    for session in sessions + virtual_location + virtual_instructor:
+        busy[session["date"]] = busy.get(session["date"], 0) | time_mask(session["start_time"], session["end_time"])
+    for day, masks in blocked.items():
+        for mask, _ in masks:
+            busy[day] = busy.get(day, 0) | mask
+    dates_by_weekday: Dict[int, List[int]] = {weekday: [] for weekday in range(1, 8)}
+    day = first_day
+    while day <= last_day:
+        dates_by_weekday[day.isoweekday()].append(busy.get(day.isoformat(), 0))
+        day += timedelta(days=1)
+    
+    # Weekdays on which each start time is free on every date
+    free_weekdays: Dict[int, List[int]] = {}
+    for start in range(earliest, latest - search.duration_minutes + 1, search.start_step_minutes):
+        slot = time_mask(minutes_to_time(start), minutes_to_time(start + search.duration_minutes))
+        free_weekdays[start] = [
+            weekday for weekday, day_masks in dates_by_weekday.items()
+            if day_masks
+            and (week is None or not slot & ~week[weekday])
+            and not any(slot & mask for mask in day_masks)
+        ]
+    
+    options = []
+    for start, weekdays in free_weekdays.items():
+        for days in itertools.combinations(weekdays, search.sessions_per_week):
+            spread = weekday_spread(days)
+            score = spread * 60 - abs(start - preferred)
+            options.append((score, start, days))
+    options.sort(key=lambda option: (-option[0], option[1], option[2]))
+    
+    return {
+        "course_id": course_id,
+        "options_considered": len(options),
+        "options": [{
+            "score": score,
+            "start_date": search.start_date,
+            "end_date": search.end_date,
+            "start_time": minutes_to_time(start),
+            "end_time": minutes_to_time(start + search.duration_minutes),
+            "recurrence_type": "weekly",
+            "recurrence_days": list(days),
+            "recurrence_interval": 1,
+            "sessions": sum(len(dates_by_weekday[weekday]) for weekday in days)
+        } for score, start, days in options[:search.top_n]]
     }
+
+# ==================== CALENDAR FEEDS ====================
+
+# Feeds cover sessions from CALENDAR_FEED_PAST_DAYS ago up to CALENDAR_FEED_FUTURE_DAYS ahead
+CALENDAR_FEED_PAST_DAYS = 90
+CALENDAR_FEED_FUTURE_DAYS = 730
+CALENDAR_TIMEZONE = "Asia/Tokyo"  # session dates/times are local to the dojo
+
+ICS_HEADER = (
+    "BEGIN:VCALENDAR\r\n"
+    "VERSION:2.0\r\n"
+    "PRODID:-//Train in Japan//Sessions//EN\r\n"
+    "CALSCALE:GREGORIAN\r\n"
+    "METHOD:PUBLISH\r\n"
+    "X-PUBLISHED-TTL:PT15M\r\n"
+    "BEGIN:VTIMEZONE\r\n"
+    f"TZID:{CALENDAR_TIMEZONE}\r\n"
+    "BEGIN:STANDARD\r\n"
+    "DTSTART:19700101T000000\r\n"
+    "TZOFFSETFROM:+0900\r\n"
+    "TZOFFSETTO:+0900\r\n"
+    "TZNAME:JST\r\n"
+    "END:STANDARD\r\n"
+    "END:VTIMEZONE\r\n"
+)
+
+def ics_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n").replace("\n", "\\n")
+
+def ics_line(line: str) -> str:
+    """Fold a content line at 75 octets (RFC 5545 3.1)"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    chunks, current = [], b""
+    for char in line:
+        char_bytes = char.encode()
+        if len(current) + len(char_bytes) > (75 if not chunks else 74):
+            chunks.append(current.decode())
+            current = b""
+        current += char_bytes
+    chunks.append(current.decode())
+    return "\r\n ".join(chunks) + "\r\n"
+
+def ics_local_time(day: str, time_of_day: str) -> str:
+    """DATE-TIME value for an ISO date and HH:MM; "24:00" becomes midnight of the next day"""
+    if time_of_day == "24:00":
+        return (as_date(day) + timedelta(days=1)).strftime("%Y%m%d") + "T000000"
+    return f"{day.replace('-', '')}T{time_of_day.replace(':', '')}00"
+
+def ics_event(session: dict, course_title: str, location_name: str) -> str:
+    stamp = session.get("created_at") or datetime.now(timezone.utc)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:{session['id']}@traininjapan",
+        f"DTSTAMP:{stamp.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}",
+        f"DTSTART;TZID={CALENDAR_TIMEZONE}:{ics_local_time(session['date'], session['start_time'])}",
+        f"DTEND;TZID={CALENDAR_TIMEZONE}:{ics_local_time(session['date'], session['end_time'])}",
+        f"SUMMARY:{ics_escape(course_title)}",
+        f"LOCATION:{ics_escape(location_name)}",
+        f"STATUS:{'CANCELLED' if session.get('status') == 'cancelled' else 'CONFIRMED'}",
+        "END:VEVENT"
+    ]
+    return "".join(ics_line(line) for line in lines)
+
+async def student_feed_token(user_id: str, regenerate: bool = False) -> str:
+    """Calendar apps cannot send cookies, so student feeds are authorized by a random per-user URL token.
+
+    The token is created on first use and stored on the user; regenerating it
+    revokes every URL handed out before.
+    """
+    token = secrets.token_urlsafe(24)
+    query = {"id": user_id} if regenerate else {"id": user_id, "calendar_feed_token": {"$in": [None, ""]}}
+    await db.users.update_one(query, {"$set": {"calendar_feed_token": token}})
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "calendar_feed_token": 1})
+    if not user or not user.get("calendar_feed_token"):
+        raise HTTPException(status_code=404, detail="User not found")
+    return user["calendar_feed_token"]
+
+async def feed_validators(extra: str = "") -> Tuple[str, Optional[datetime]]:
+    """ETag and Last-Modified for a feed, from the write counters of everything a feed shows
+    (sessions, course titles, location names, instructor names)"""
+    versions, last_modified = await get_collection_versions_with_stamp("course_sessions", "courses", "locations", "instructors")
+    etag = make_etag(versions)
+    if extra:
+        etag = etag[:-1] + "-" + hashlib.sha1(extra.encode()).hexdigest()[:12] + '"'
+    return etag, last_modified
+
+def feed_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(etag, if_none_match)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def calendar_feed(
+    request: Request,
+    name: str,
+    session_query: dict,
+    virtual_query: Optional[dict],
+    extra_etag: str = "",
+    send_last_modified: bool = True
+) -> Response:
+    """Stream an .ics feed of the sessions matching session_query (plus virtual occurrences)"""
+    etag, last_modified = await feed_validators(extra_etag)
+    if not send_last_modified:
+        last_modified = None
+    headers = {"ETag": etag, "Cache-Control": "private, max-age=0, must-revalidate"}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified.astimezone(timezone.utc), usegmt=True)
+    if feed_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    today = datetime.now(timezone.utc).date()
+    from_date = (today - timedelta(days=CALENDAR_FEED_PAST_DAYS)).isoformat()
+    to_date = (today + timedelta(days=CALENDAR_FEED_FUTURE_DAYS)).isoformat()
+    query = {**session_query, "date": {"$gte": from_date, "$lte": to_date}}
+    virtual = await unmaterialized_sessions(virtual_query, from_date, to_date) if virtual_query else []
+    
+    course_titles: Dict[str, str] = {}
+    location_names: Dict[str, str] = {}
+    
+    async def describe(session: dict) -> Tuple[str, str]:
+        if session["course_id"] not in course_titles:
+            course = await db.courses.find_one({"id": session["course_id"]}, {"_id": 0, "title": 1})
+            course_titles[session["course_id"]] = course["title"] if course else "Training session"
+        if session["location_id"] not in location_names:
+            location = await db.locations.find_one({"id": session["location_id"]}, {"_id": 0, "name": 1, "address": 1, "city": 1})
+            location_names[session["location_id"]] = ", ".join(
+                part for part in (location.get("name"), location.get("address"), location.get("city")) if part
+            ) if location else ""
+        return course_titles[session["course_id"]], location_names[session["location_id"]]
+    
+    async def body():
+        yield ICS_HEADER + ics_line(f"X-WR-CALNAME:{ics_escape(name)}") + ics_line(f"X-WR-TIMEZONE:{CALENDAR_TIMEZONE}")
+        cursor = db.course_sessions.find(query, {"_id": 0}).sort([("date", 1), ("start_time", 1)])
+        async for session in cursor:
+            yield ics_event(session, *(await describe(session)))
+        for session in virtual:
+            yield ics_event(session, *(await describe(session)))
+        yield "END:VCALENDAR\r\n"
+    
+    return StreamingResponse(body(), media_type="text/calendar; charset=utf-8", headers=headers)
+
+@api_router.get("/calendar/instructors/{instructor_id}.ics")
+async def instructor_calendar(instructor_id: str, request: Request):
+    """Subscribable feed of an instructor's sessions"""
+    instructor = await db.instructors.find_one({"id": instructor_id}, {"_id": 0, "name": 1})
+    if not instructor:
+        raise HTTPException(status_code=404, detail="Instructor not found")
+    return await calendar_feed(request, f"{instructor['name']} - Train in Japan", {"instructor_id": instructor_id}, {"instructor_id": instructor_id})
+
+@api_router.get("/calendar/locations/{location_id}.ics")
+async def location_calendar(location_id: str, request: Request):
+    """Subscribable feed of the sessions held at a location"""
+    location = await db.locations.find_one({"id": location_id}, {"_id": 0, "name": 1})
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    return await calendar_feed(request, f"{location['name']} - Train in Japan", {"location_id": location_id}, {"location_id": location_id})
+
+@api_router.get("/calendar/students/{user_id}.ics")
+async def student_calendar(user_id: str, request: Request, token: str = ""):
+    """Subscribable feed of the sessions a student has booked (URL from /calendar/my-feed)"""
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "calendar_feed_token": 1})
+    stored_token = (user or {}).get("calendar_feed_token") or ""
+    if not token or not stored_token or not hmac.compare_digest(token, stored_token):
+        raise HTTPException(status_code=403, detail="Invalid calendar token")
+    bookings = await db.bookings.find(
+        {"user_id": user_id, "status": {"$in": SEAT_HOLDING_STATUSES}}, {"_id": 0, "session_ids": 1}
+    ).to_list(None)
+    session_ids = sorted({session_id for booking in bookings for session_id in booking.get("session_ids", [])})
+    # Booking changes move no collection counter, so only the ETag (which hashes the booked sessions) can validate
+    return await calendar_feed(
+        request, "My training - Train in Japan", {"id": {"$in": session_ids}}, None,
+        extra_etag=",".join(session_ids), send_last_modified=False
+    )
+
+def student_feed_url(user_id: str, token: str) -> str:
+    return f"/api/calendar/students/{user_id}.ics?token={token}"
+
+@api_router.get("/calendar/my-feed")
+async def my_calendar_feed(current_user: User = Depends(get_current_user)):
+    """Feed URL for the current user's booked sessions, for calendar app subscriptions"""
+    return {"url": student_feed_url(current_user.id, await student_feed_token(current_user.id))}
+
+@api_router.post("/calendar/my-feed/regenerate")
+async def regenerate_calendar_feed(current_user: User = Depends(get_current_user)):
+    """Revoke the current feed URL and issue a new one"""
+    return {"url": student_feed_url(current_user.id, await student_feed_token(current_user.id, regenerate=True))}
+
+# ==================== CALENDAR VIEW ====================
+
+# Longest range the calendar view returns in one call (a month view plus its padding weeks)
+CALENDAR_VIEW_MAX_DAYS = 92
+
+@api_router.get("/calendar/sessions")
+async def get_calendar_sessions(scope: str, scope_id: str, start_date: str, end_date: str):
+    """Sessions for a school, location or instructor between two dates, grouped by day.
+
+    One aggregation groups the sessions per date and sums booked seats and
+    capacity, so the client renders a month without a request per course.
+    Virtual occurrences are merged in with zero bookings.
+    """
+    scope_fields = {"location": "location_id", "instructor": "instructor_id", "school": "course_id"}
+    if scope not in scope_fields:
+        raise HTTPException(status_code=400, detail="scope must be school, location or instructor")
+    try:
+        span = (as_date(end_date) - as_date(start_date)).days
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if not 0 <= span < CALENDAR_VIEW_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be forwards and at most {CALENDAR_VIEW_MAX_DAYS} days")
+    
+    if scope == "school":
+        course_ids = await db.courses.distinct("id", {"school_id": scope_id})
+        match_value = {"$in": course_ids}
+    else:
+        match_value = scope_id
+    
+    days, virtual = await asyncio.gather(
+        db.course_sessions.aggregate([
+            {"$match": {scope_fields[scope]: match_value, "date": {"$gte": start_date, "$lte": end_date}}},
+            {"$sort": {"date": 1, "start_time": 1}},
+            {"$group": {
+                "_id": "$date",
+                "booked": {"$sum": {"$cond": [{"$eq": ["$status", "scheduled"]}, "$current_enrollment", 0]}},
+                "capacity": {"$sum": {"$cond": [{"$eq": ["$status", "scheduled"]}, "$max_capacity", 0]}},
+                "sessions": {"$push": {
+                    "id": "$id",
+                    "course_id": "$course_id",
+                    "start": "$start_time",
+                    "end": "$end_time",
+                    "booked": "$current_enrollment",
+                    "capacity": "$max_capacity",
+                    "status": "$status"
+                }}
+            }},
+            {"$sort": {"_id": 1}}
+        ]).to_list(None),
+        unmaterialized_sessions({scope_fields[scope]: match_value}, start_date, end_date)
+    )
     
-    # Check location conflicts
-    if location_id:
-        # Find all sessions at this location in the date range
-        location_sessions = await db.course_sessions.find({
-            "location_id": location_id,
-            "date": {"$gte": start_date, "$lte": end_date},
-            "status": "scheduled"
-        }, {"_id": 0}).to_list(1000)
-        
-        for session in location_sessions:
-            # Check time overlap
-            if (start_time < session["end_time"] and end_time > session["start_time"]):
-                conflicts["location_conflicts"].append({
-                    "session_id": session["id"],
-                    "date": session["date"],
-                    "time": f"{session['start_time']}-{session['end_time']}"
-                })
-                conflicts["has_conflict"] = True
-    
-    # Check instructor conflicts
-    if instructor_id:
-        instructor_sessions = await db.course_sessions.find({
-            "instructor_id": instructor_id,
-            "date": {"$gte": start_date, "$lte": end_date},
-            "status": "scheduled"
-        }, {"_id": 0}).to_list(1000)
-        
-        for session in instructor_sessions:
-            if (start_time < session["end_time"] and end_time > session["start_time"]):
-                conflicts["instructor_conflicts"].append({
-                    "session_id": session["id"],
-                    "date": session["date"],
-                    "time": f"{session['start_time']}-{session['end_time']}"
-                })
-                conflicts["has_conflict"] = True
+    by_date = {day["_id"]: {"date": day["_id"], "booked": day["booked"], "capacity": day["capacity"], "sessions": day["sessions"]} for day in days}
+    for session in virtual:
+        day = by_date.setdefault(session["date"], {"date": session["date"], "booked": 0, "capacity": 0, "sessions": []})
+        day["capacity"] += session["max_capacity"]
+        day["sessions"].append({
+            "id": session["id"],
+            "course_id": session["course_id"],
+            "start": session["start_time"],
+            "end": session["end_time"],
+            "booked": 0,
+            "capacity": session["max_capacity"],
+            "status": session["status"]
+        })
     
-    return conflicts
+    result_days = []
+    for date_key in sorted(by_date):
+        day = by_date[date_key]
+        if virtual:
+            day["sessions"].sort(key=lambda session: session["start"])
+        day["remaining"] = day["capacity"] - day["booked"]
+        result_days.append(day)
+    
+    course_ids_seen = list({session["course_id"] for day in result_days for session in day["sessions"]})
+    courses = await db.courses.find({"id": {"$in": course_ids_seen}}, {"_id": 0, "id": 1, "title": 1}).to_list(len(course_ids_seen))
+    return {
+        "scope": scope,
+        "scope_id": scope_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "courses": {course["id"]: course["title"] for course in courses},
+        "days": result_days
+    }
 
 # ==================== INSTRUCTOR AVAILABILITY ====================
 
+def validate_availability(availability_data: AvailabilityCreate):
+    """Reject blocks compile_availability could not read later"""
+    if not 1 <= availability_data.day_of_week <= 7:
+        raise HTTPException(status_code=400, detail="day_of_week must be 1 (Monday) to 7 (Sunday)")
+    if parse_time_of_day(availability_data.end_time) <= parse_time_of_day(availability_data.start_time):
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+
 @api_router.post("/instructors/{instructor_id}/availability")
 async def create_instructor_availability(
     instructor_id: str,
@@ -1627,14 +3581,15 @@ async def create_instructor_availability(
     """Set instructor availability"""
     if current_user.role not in ["school", "admin"]:
         raise HTTPException(status_code=403, detail="Only schools can set availability")
+    validate_availability(availability_data)
     
     availability = InstructorAvailability(
         instructor_id=instructor_id,
         **availability_data.model_dump()
     )
     availability_dict = availability.model_dump()
-    availability_dict["created_at"] = availability_dict["created_at"].isoformat()
     await db.instructor_availability.insert_one(availability_dict)
+    await bump_collection_version(SchedulingConstraints.availability_key(instructor_id))
     
     return {"success": True, "availability_id": availability.id}
 
@@ -1656,12 +3611,75 @@ async def delete_availability(
     if current_user.role not in ["school", "admin"]:
         raise HTTPException(status_code=403, detail="Only schools can delete availability")
     
-    result = await db.instructor_availability.delete_one({"id": availability_id})
-    if result.deleted_count == 0:
+    deleted = await db.instructor_availability.find_one_and_delete({"id": availability_id}, projection={"_id": 0, "instructor_id": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Availability not found")
+    await bump_collection_version(SchedulingConstraints.availability_key(deleted["instructor_id"]))
     
     return {"success": True}
 
+# ==================== LOCATION CALENDAR BLOCKS ====================
+
+async def get_owned_location(location_id: str, current_user: User) -> dict:
+    if current_user.role not in ["school", "admin"]:
+        raise HTTPException(status_code=403, detail="Only schools can manage calendar blocks")
+    location = await db.locations.find_one({"id": location_id}, {"_id": 0, "id": 1, "school_id": 1})
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    if current_user.role == "school" and location["school_id"] != current_user.school_id:
+        raise HTTPException(status_code=403, detail="You can only manage your own locations")
+    return location
+
+def validate_calendar_block(block_data: CalendarBlockCreate):
+    try:
+        if as_date(block_data.end_date) < as_date(block_data.start_date):
+            raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+    if parse_time_of_day(block_data.end_time) <= parse_time_of_day(block_data.start_time):
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+
+@api_router.post("/locations/{location_id}/calendar-blocks")
+async def create_calendar_block(location_id: str, block_data: CalendarBlockCreate, current_user: User = Depends(get_current_user)):
+    """Block a location for a date range (each day between start_time and end_time)"""
+    await get_owned_location(location_id, current_user)
+    validate_calendar_block(block_data)
+    block = LocationCalendarBlock(location_id=location_id, **block_data.model_dump())
+    await db.location_calendar_blocks.insert_one(block.model_dump())
+    await bump_collection_version(SchedulingConstraints.blocks_key(location_id))
+    return block
+
+@api_router.get("/locations/{location_id}/calendar-blocks")
+async def get_calendar_blocks(location_id: str, from_date: Optional[str] = None, to_date: Optional[str] = None):
+    """Calendar blocks for a location, optionally only those overlapping [from_date, to_date]"""
+    query = {"location_id": location_id}
+    if from_date:
+        query["end_date"] = {"$gte": from_date}
+    if to_date:
+        query["start_date"] = {"$lte": to_date}
+    return await db.location_calendar_blocks.find(query, {"_id": 0}).sort("start_date", 1).to_list(None)
+
+@api_router.put("/calendar-blocks/{block_id}")
+async def update_calendar_block(block_id: str, block_data: CalendarBlockCreate, current_user: User = Depends(get_current_user)):
+    existing = await db.location_calendar_blocks.find_one({"id": block_id}, {"_id": 0})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Calendar block not found")
+    await get_owned_location(existing["location_id"], current_user)
+    validate_calendar_block(block_data)
+    await db.location_calendar_blocks.update_one({"id": block_id}, {"$set": block_data.model_dump()})
+    await bump_collection_version(SchedulingConstraints.blocks_key(existing["location_id"]))
+    return {**existing, **block_data.model_dump()}
+
+@api_router.delete("/calendar-blocks/{block_id}")
+async def delete_calendar_block(block_id: str, current_user: User = Depends(get_current_user)):
+    existing = await db.location_calendar_blocks.find_one({"id": block_id}, {"_id": 0, "location_id": 1})
+    if not existing:
+        raise HTTPException(status_code=404, detail="Calendar block not found")
+    await get_owned_location(existing["location_id"], current_user)
+    await db.location_calendar_blocks.delete_one({"id": block_id})
+    await bump_collection_version(SchedulingConstraints.blocks_key(existing["location_id"]))
+    return {"success": True}
+
 @api_router.patch("/courses/{course_id}/instructor-confirm")
 async def instructor_confirm_course(
     course_id: str,
@@ -1686,6 +3704,9 @@ async def instructor_confirm_course(
         {"id": course_id},
         {"$set": {"instructor_confirmed": True, "status": "confirmed"}}
     )
+    await location_occupancy.record(course, {**course, "instructor_confirmed": True, "status": "confirmed"})
+    catalog_cache.invalidate_course(course)
+    await bump_collection_version("courses")
     
     return {"success": True, "message": "Course confirmed"}
 
@@ -1704,6 +3725,9 @@ async def instructor_decline_course(
         {"id": course_id},
         {"$set": {"instructor_confirmed": False, "status": "pending_instructor"}}
     )
+    await location_occupancy.record(course, {**course, "instructor_confirmed": False, "status": "pending_instructor"})
+    catalog_cache.invalidate_course(course)
+    await bump_collection_version("courses")
     
     return {"success": True, "message": "Course declined, needs new instructor"}
 
@@ -1729,8 +3753,6 @@ async def join_waitlist(
     )
     
     entry_dict = entry.model_dump()
-    entry_dict["created_at"] = entry_dict["created_at"].isoformat()
-    entry_dict["offer_expires_at"] = entry_dict.get("offer_expires_at").isoformat() if entry_dict.get("offer_expires_at") else None
     
     await db.waitlist.insert_one(entry_dict)
     
@@ -1765,8 +3787,140 @@ async def leave_waitlist(
     
     return {"success": True}
 
+# How long a waitlisted student has to take up an offered seat
+WAITLIST_OFFER_HOURS = 24
+
+async def promote_waitlist(course_id: str, freed: Dict[Optional[str], int]) -> int:
+    """Offer freed seats to the front of the waitlist in one read and one write.
+
+    freed maps session_id -> seats freed in that session, with None standing
+    for whole-course seats. Entries with a session_id only get offers for
+    that session; course-level entries take the None seats.
+    """
+    freed = {session_id: seats for session_id, seats in freed.items() if seats > 0}
+    if not freed:
+        return 0
+    
+    groups = await db.waitlist.aggregate([
+        {"$match": {"course_id": course_id, "notified": False, "session_id": {"$in": list(freed)}}},
+        {"$sort": {"position": 1}},
+        {"$group": {"_id": "$session_id", "entry_ids": {"$push": "$id"}}}
+    ]).to_list(None)
+    entry_ids = [entry_id for group in groups for entry_id in group["entry_ids"][:freed[group["_id"]]]]
+    if not entry_ids:
+        return 0
+    
+    result = await db.waitlist.update_many(
+        {"id": {"$in": entry_ids}, "notified": False},
+        {"$set": {"notified": True, "offer_expires_at": datetime.now(timezone.utc) + timedelta(hours=WAITLIST_OFFER_HOURS)}}
+    )
+    return result.modified_count
+
+@job_handler("waitlist.promote")
+async def promote_waitlist_job(payload: dict):
+    """A cancelled booking freed the course seat and one seat in each of its sessions"""
+    await promote_waitlist(payload["course_id"], {None: 1, **{session_id: 1 for session_id in payload.get("session_ids", [])}})
+
 # ==================== SESSION-BASED BOOKINGS ====================
 
+# Sessions record which bookings hold their seats in booking_ids, so a
+# reservation can be undone (or cancelled) exactly once per session.
+transactions_supported = MONGO_TRANSACTIONS
+
+async def run_in_transaction(write) -> Tuple[bool, object]:
+    """Run write(session) in a transaction and return (True, its result).
+
+    Returns (False, None) without writing anything when transactions are
+    disabled or the server is not a replica set member; the caller then runs
+    write() without a session, with its own compensating writes.
+    """
+    global transactions_supported
+    if transactions_supported:
+        try:
+            async with await client.start_session() as session:
+                return True, await session.with_transaction(write)
+        except OperationFailure as e:
+            if e.code != 20:  # IllegalOperation: not a replica set member
+                raise
+            transactions_supported = False
+            logger.warning("MongoDB transactions are not available; using compensating writes")
+    return False, None
+
+async def release_session_seats(booking_id: str, session_ids: List[str], session=None):
+    await db.course_sessions.update_many(
+        {"id": {"$in": session_ids}, "booking_ids": booking_id},
+        {"$inc": {"current_enrollment": -1}, "$pull": {"booking_ids": booking_id}},
+        session=session
+    )
+
+async def free_booking_sessions(booking_id: str, session_ids: List[str]):
+    """Give back a cancelled booking's seat in every session with one ordered bulk_write"""
+    await db.course_sessions.bulk_write([
+        # Bookings made before sessions tracked booking_ids hold an unmarked seat
+        UpdateMany(
+            {"id": {"$in": session_ids}, "booking_ids": {"$ne": booking_id}, "current_enrollment": {"$gt": 0}},
+            {"$inc": {"current_enrollment": -1}}
+        ),
+        UpdateMany(
+            {"id": {"$in": session_ids}, "booking_ids": booking_id},
+            {"$inc": {"current_enrollment": -1}, "$pull": {"booking_ids": booking_id}}
+        )
+    ], ordered=True)
+
+async def reserve_session_seats(booking_dict: dict) -> Optional[List[dict]]:
+    """Take a seat in every session of the booking and insert it, all or nothing.
+
+    One conditional bulk_write reserves the seats (each update only matches
+    while current_enrollment < max_capacity). If any session was full the
+    transaction is aborted - or, on a standalone server, the seats that were
+    taken are handed back - and the sessions that are full are returned.
+    Returns None when the booking went through. The course seat is taken
+    with the same guarded update as create_booking; a full course raises 400
+    and undoes the session seats the same way.
+    """
+    booking_id = booking_dict["id"]
+    session_ids = booking_dict["session_ids"]
+    operations = [
+        UpdateOne(
+            {"id": session_id, "$expr": {"$lt": ["$current_enrollment", "$max_capacity"]}},
+            {"$inc": {"current_enrollment": 1}, "$addToSet": {"booking_ids": booking_id}}
+        )
+        for session_id in session_ids
+    ]
+    
+    async def write(session=None) -> bool:
+        result = await db.course_sessions.bulk_write(operations, ordered=False, session=session)
+        if result.modified_count < len(operations):
+            if session is not None:
+                await session.abort_transaction()
+            else:
+                await release_session_seats(booking_id, session_ids)
+            return False
+        if not await reserve_course_seat(booking_dict["course_id"], session=session):
+            raise HTTPException(status_code=400, detail="Course is full")
+        try:
+            await db.bookings.insert_one(booking_dict, session=session)
+        except Exception:
+            if session is None:
+                await release_course_seat(booking_dict["course_id"])
+            raise
+        return True
+    
+    in_transaction, booked = await run_in_transaction(write)
+    if not in_transaction:
+        try:
+            booked = await write()
+        except Exception:
+            await release_session_seats(booking_id, session_ids)
+            raise
+    
+    if booked:
+        return None
+    return await db.course_sessions.find(
+        {"id": {"$in": session_ids}, "$expr": {"$gte": ["$current_enrollment", "$max_capacity"]}},
+        {"_id": 0, "id": 1, "date": 1, "start_time": 1}
+    ).to_list(len(session_ids))
+
 @api_router.post("/bookings/sessions")
 async def book_sessions(
     booking_data: dict,
@@ -1780,24 +3934,15 @@ async def book_sessions(
     
     if not session_ids:
         raise HTTPException(status_code=400, detail="No sessions selected")
+    session_ids = list(dict.fromkeys(session_ids))
     
-    # Get sessions and validate
-    sessions = await db.course_sessions.find(
-        {"id": {"$in": session_ids}},
-        {"_id": 0}
-    ).to_list(len(session_ids))
+    # Get sessions and validate (capacity is checked when the seats are reserved).
+    # Virtual sessions are stored now, since the booking attaches to them.
+    sessions = list((await materialize_sessions(session_ids)).values())
     
     if len(sessions) != len(session_ids):
         raise HTTPException(status_code=404, detail="Some sessions not found")
     
-    # Check capacity for each session
-    for session in sessions:
-        if session["current_enrollment"] >= session["max_capacity"]:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Session on {session['date']} is full"
-            )
-    
     # Get course for pricing
     course_id = sessions[0]["course_id"]
     course = await db.courses.find_one({"id": course_id}, {"_id": 0})
@@ -1820,15 +3965,12 @@ async def book_sessions(
         status="pending"
     )
     
-    booking_dict = booking.model_dump()
-    booking_dict["booking_date"] = booking_dict["booking_date"].isoformat()
-    await db.bookings.insert_one(booking_dict)
-    
-    # Update session enrollment
-    for session_id in session_ids:
-        await db.course_sessions.update_one(
-            {"id": session_id},
-            {"$inc": {"current_enrollment": 1}}
+    full_sessions = await reserve_session_seats(booking.model_dump())
+    if full_sessions is not None:
+        dates = ", ".join(f"{session['date']} {session['start_time']}" for session in full_sessions) or "please try again"
+        raise HTTPException(
+            status_code=400,
+            detail={"message": f"Some sessions are full: {dates}", "full_sessions": full_sessions}
         )
     
     return {
@@ -1847,14 +3989,13 @@ async def confirm_booking(
     if current_user.role not in ["school", "admin"]:
         raise HTTPException(status_code=403, detail="Only schools can confirm bookings")
     
-    result = await db.bookings.update_one(
-        {"id": booking_id},
-        {"$set": {"status": "confirmed"}}
-    )
-    
-    if result.matched_count == 0:
+    booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0, "id": 1, "course_id": 1, "status": 1})
+    if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
+    if not await update_booking_status(booking, {"status": "confirmed"}):
+        raise HTTPException(status_code=409, detail="Booking was modified, please retry")
+    
     return {"success": True, "message": "Booking confirmed"}
 
 @api_router.patch("/bookings/{booking_id}/cancel")
@@ -1871,38 +4012,21 @@ async def cancel_booking(
     if current_user.role not in ["school", "admin"] and booking["user_id"] != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Update booking status
-    await db.bookings.update_one(
-        {"id": booking_id},
-        {"$set": {"status": "cancelled"}}
-    )
+    if booking["status"] == "cancelled":
+        return {"success": True, "message": "Booking already cancelled"}
     
-    # Free up session slots
-    for session_id in booking.get("session_ids", []):
-        await db.course_sessions.update_one(
-            {"id": session_id},
-            {"$inc": {"current_enrollment": -1}}
-        )
+    # Update booking status (releases the course seat)
+    if not await update_booking_status(booking, {"status": "cancelled"}):
+        raise HTTPException(status_code=409, detail="Booking was modified, please retry")
     
-    # Check waitlist and notify next person
-    course_id = booking["course_id"]
-    next_in_waitlist = await db.waitlist.find_one(
-        {"course_id": course_id, "notified": False},
-        {"_id": 0},
-        sort=[("position", 1)]
-    )
+    if booking["status"] not in SEAT_HOLDING_STATUSES:
+        return {"success": True, "message": "Booking cancelled"}
     
-    if next_in_waitlist:
-        # Mark as notified and set expiration (24 hours)
-        from datetime import datetime, timedelta, timezone
-        expires_at = datetime.now(timezone.utc) + timedelta(hours=24)
-        await db.waitlist.update_one(
-            {"id": next_in_waitlist["id"]},
-            {"$set": {
-                "notified": True,
-                "offer_expires_at": expires_at.isoformat()
-            }}
-        )
+    # Free up session slots; offering them (and the course seat) to the waitlist happens in the background
+    session_ids = booking.get("session_ids", [])
+    if session_ids:
+        await free_booking_sessions(booking_id, session_ids)
+    await enqueue_job("waitlist.promote", {"course_id": booking["course_id"], "session_ids": session_ids}, dedupe_key=f"waitlist.promote:{booking_id}")
     
     return {"success": True, "message": "Booking cancelled"}
 
@@ -1911,20 +4035,31 @@ async def cancel_booking(
 # ==================== COURSES ====================
 
 @api_router.get("/courses/{course_id}", response_model=Course)
-async def get_course(course_id: str):
+async def get_course(course_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
     """Get a single course by ID"""
-    course = await db.courses.find_one({"id": course_id}, {"_id": 0})
+    versions = await get_collection_versions("courses")
+    not_modified = conditional_response(make_etag(versions), if_none_match, response)
+    if not_modified:
+        return not_modified
+    
+    cache_key = ("course", course_id)
+    cached = catalog_cache.get(cache_key, versions, response)
+    if cached:
+        return cached
+    
+    course = await db.courses.find_one({"id": course_id}, COURSE_JSON.projection)
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
-    if isinstance(course["created_at"], str):
-        course["created_at"] = datetime.fromisoformat(course["created_at"])
-    return Course(**course)
+    return catalog_cache.put(cache_key, versions, COURSE_JSON.dump_one(course), response)
 
 # ==================== PROGRAM ALIASES (for frontend compatibility) ====================
 # These endpoints are aliases for /courses endpoints
 
+# School fields embedded in each program (including tagline, bio, and full details for updated branding)
+PROGRAM_SCHOOL_PROJECTION = {"_id": 0, "id": 1, "name": 1, "logo_url": 1, "banner_url": 1, "tagline": 1, "bio": 1, "location": 1, "description": 1, "contact_email": 1, "website": 1}
+
 @api_router.get("/programs")
-async def get_programs(school_id: Optional[str] = None, location_id: Optional[str] = None, instructor_id: Optional[str] = None, martial_arts_style: Optional[str] = None, experience_level: Optional[str] = None):
+async def get_programs(response: Response, school_id: Optional[str] = None, location_id: Optional[str] = None, instructor_id: Optional[str] = None, martial_arts_style: Optional[str] = None, experience_level: Optional[str] = None, page: PageParams = Depends(page_params), if_none_match: Optional[str] = Header(None)):
     """Get programs with school branding information"""
     logging.info(f"get_programs called with params: school_id={school_id}, location_id={location_id}, instructor_id={instructor_id}, martial_arts_style={martial_arts_style}, experience_level={experience_level}")
     
@@ -1941,35 +4076,37 @@ async def get_programs(school_id: Optional[str] = None, location_id: Optional[st
     if experience_level:
         query["experience_level"] = experience_level
     
+    # Programs embed school branding, so they change with either collection
+    versions = await get_collection_versions("courses", "schools")
+    not_modified = conditional_response(make_etag(versions), if_none_match, response)
+    if not_modified:
+        return not_modified
+    
+    cache_key = CatalogCache.list_key("programs", (school_id, location_id, instructor_id, martial_arts_style, experience_level), page)
+    cached = catalog_cache.get(cache_key, versions, response)
+    if cached:
+        return cached
+    
     # Fetch courses
-    courses = await db.courses.find(query, {"_id": 0}).to_list(1000)
+    courses = COURSE_JSON.prepare(await find_page(db.courses, query, ["created_at", "id"], page, response, COURSE_JSON.projection))
+    
+    # Fetch branding for every school on this page in one query
+    school_ids = list({course["school_id"] for course in courses if course.get("school_id")})
+    schools_by_id = {}
+    if school_ids:
+        async for school_doc in db.schools.find({"id": {"$in": school_ids}}, PROGRAM_SCHOOL_PROJECTION):
+            schools_by_id[school_doc["id"]] = school_doc
     
-    # Fetch school data for each course
-    school_cache = {}
     for course in courses:
-        if isinstance(course["created_at"], str):
-            course["created_at"] = datetime.fromisoformat(course["created_at"])
-        
-        # Get school data (including tagline, bio, and full details for updated branding)
-        school_id_val = course.get("school_id")
-        if school_id_val and school_id_val not in school_cache:
-            school_doc = await db.schools.find_one({"id": school_id_val}, {"_id": 0, "id": 1, "name": 1, "logo_url": 1, "banner_url": 1, "tagline": 1, "bio": 1, "location": 1, "description": 1, "contact_email": 1, "website": 1})
-            if school_doc:
-                school_cache[school_id_val] = school_doc
-        
-        # Add school data to course
-        if school_id_val and school_id_val in school_cache:
-            course["school"] = school_cache[school_id_val]
-        else:
-            course["school"] = None
+        course["school"] = schools_by_id.get(course.get("school_id"))
     
     logging.info(f"get_programs returning {len(courses)} courses with school data")
-    return courses
+    return catalog_cache.put(cache_key, versions, encode_json(courses), response, school_ids=set(school_ids))
 
 @api_router.get("/programs/{program_id}", response_model=Course)
-async def get_program(program_id: str):
+async def get_program(program_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
     """Alias for get_course"""
-    return await get_course(program_id)
+    return await get_course(program_id, response, if_none_match)
 
 @api_router.post("/programs/{program_id}/bookings", response_model=Booking)
 async def create_program_booking(program_id: str, booking_data: BookingCreate, current_user: User = Depends(get_current_user)):
@@ -1978,6 +4115,67 @@ async def create_program_booking(program_id: str, booking_data: BookingCreate, c
 
 # ==================== PAYMENTS ====================
 
+async def confirm_paid_booking(booking_id: str, extra: Optional[dict] = None) -> bool:
+    """Confirm a paid booking; a paid seat is kept even if the course has filled up since"""
+    for _ in range(3):
+        booking = await db.bookings.find_one({"id": booking_id}, {"_id": 0, "id": 1, "course_id": 1, "status": 1})
+        if not booking:
+            return True
+        updates = {"payment_status": "paid", "status": "confirmed", **(extra or {})}
+        if await update_booking_status(booking, updates, enforce_capacity=False):
+            return True
+    return False
+
+async def mark_booking_paid(booking_id: str, extra: Optional[dict] = None):
+    if not await confirm_paid_booking(booking_id, extra):
+        logger.warning(f"Could not mark booking {booking_id} as paid: status kept changing, retrying in the background")
+        await enqueue_job("bookings.mark_paid", {"booking_id": booking_id, "extra": extra}, dedupe_key=f"bookings.mark_paid:{booking_id}")
+
+@job_handler("bookings.mark_paid")
+async def mark_booking_paid_job(payload: dict):
+    if not await confirm_paid_booking(payload["booking_id"], payload.get("extra")):
+        raise RuntimeError(f"Could not mark booking {payload['booking_id']} as paid: status kept changing")
+
+async def apply_checkout_paid(transaction: dict, amount_total: Optional[int] = None):
+    """Record a paid Stripe checkout on its transaction and booking"""
+    await db.payment_transactions.update_one(
+        {"session_id": transaction["session_id"]},
+        {"$set": {"payment_status": "paid", "paid_at": datetime.now(timezone.utc)}}
+    )
+    await mark_booking_paid(transaction["booking_id"], {"amount_paid": amount_total / 100.0} if amount_total is not None else None)
+
+# Status lookups and webhook verification don't use the webhook URL (only create_checkout does),
+# so they share one client instead of building one per request
+stripe_status_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url="https://example.com/api/webhook/stripe")
+
+# Catch payments whose webhook never arrived
+PAYMENT_RECONCILE_DELAY_SECONDS = 30 * 60
+
+@job_handler("payments.reconcile")
+async def reconcile_payment_job(payload: dict):
+    transaction = await db.payment_transactions.find_one({"session_id": payload["session_id"]}, {"_id": 0})
+    if not transaction or transaction["payment_status"] == "paid":
+        return
+    checkout_status = await stripe_status_checkout.get_checkout_status(payload["session_id"])
+    if checkout_status.payment_status == "paid":
+        await apply_checkout_paid(transaction, checkout_status.amount_total)
+
+# Checkout events that can carry a completed payment
+STRIPE_PAID_EVENT_TYPES = {"checkout.session.completed", "checkout.session.async_payment_succeeded"}
+
+@job_handler("payments.stripe_event")
+async def apply_stripe_event_job(payload: dict):
+    """Apply a verified Stripe webhook event: the transaction first, then its booking"""
+    if payload["event_type"] not in STRIPE_PAID_EVENT_TYPES or payload["payment_status"] != "paid":
+        return
+    transaction = await db.payment_transactions.find_one({"session_id": payload["session_id"]}, {"_id": 0})
+    if not transaction:
+        # Only checkouts started by create_checkout can confirm a booking
+        logger.warning(f"Ignoring Stripe event {payload['event_id']} for unknown checkout session {payload['session_id']}")
+        return
+    if transaction["payment_status"] != "paid":
+        await apply_checkout_paid(transaction)
+
 @api_router.post("/payments/checkout")
 async def create_checkout(checkout_data: CheckoutRequest, current_user: User = Depends(get_current_user)):
     course_id = checkout_data.course_id
@@ -2034,11 +4232,11 @@ async def create_checkout(checkout_data: CheckoutRequest, current_user: User = D
         metadata=metadata
     )
     payment_dict = payment_transaction.model_dump()
-    payment_dict["created_at"] = payment_dict["created_at"].isoformat()
     await db.payment_transactions.insert_one(payment_dict)
     
     # Update booking with session ID
     await db.bookings.update_one({"id": booking_id}, {"$set": {"payment_session_id": session.session_id}})
+    await enqueue_job("payments.reconcile", {"session_id": session.session_id}, delay_seconds=PAYMENT_RECONCILE_DELAY_SECONDS)
     
     return {"checkout_url": session.url, "session_id": session.session_id}
 
@@ -2052,61 +4250,43 @@ async def get_payment_status(session_id: str, current_user: User = Depends(get_c
     if existing_transaction["payment_status"] == "paid":
         return {"status": "paid", "booking_id": existing_transaction["booking_id"]}
     
-    # Initialize Stripe
-    webhook_url = "https://example.com/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     # Get status from Stripe
-    checkout_status = await stripe_checkout.get_checkout_status(session_id)
+    checkout_status = await stripe_status_checkout.get_checkout_status(session_id)
     
     if checkout_status.payment_status == "paid" and existing_transaction["payment_status"] != "paid":
-        # Update payment transaction
-        await db.payment_transactions.update_one(
-            {"session_id": session_id},
-            {"$set": {"payment_status": "paid", "paid_at": datetime.now(timezone.utc).isoformat()}}
-        )
-        
-        # Update booking
-        await db.bookings.update_one(
-            {"id": existing_transaction["booking_id"]},
-            {"$set": {"payment_status": "paid", "status": "confirmed", "amount_paid": checkout_status.amount_total / 100.0}}
-        )
-        
+        await apply_checkout_paid(existing_transaction, checkout_status.amount_total)
         return {"status": "paid", "booking_id": existing_transaction["booking_id"]}
     
     return {"status": checkout_status.payment_status, "booking_id": existing_transaction["booking_id"]}
 
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
+    """Verify the event, store it and acknowledge; the updates run as a job.
+
+    The stored job doubles as the event record: its id is derived from the
+    Stripe event id, so a redelivered event is acknowledged without being
+    applied twice. The single insert is awaited on purpose - Stripe only redelivers
+    events that were not acknowledged, so the event must be durable first.
+    """
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    host_url = "https://example.com"  # This will be set dynamically
-    webhook_url = f"{host_url}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        
-        if webhook_response.payment_status == "paid":
-            # Update payment transaction
-            await db.payment_transactions.update_one(
-                {"session_id": webhook_response.session_id},
-                {"$set": {"payment_status": "paid", "paid_at": datetime.now(timezone.utc).isoformat()}}
-            )
-            
-            # Get booking ID from metadata
-            if webhook_response.metadata and "booking_id" in webhook_response.metadata:
-                booking_id = webhook_response.metadata["booking_id"]
-                await db.bookings.update_one(
-                    {"id": booking_id},
-                    {"$set": {"payment_status": "paid", "status": "confirmed"}}
-                )
-        
-        return {"success": True}
+        webhook_response = await stripe_status_checkout.handle_webhook(body, signature)
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
+    
+    await enqueue_job("payments.stripe_event", {
+        "event_id": webhook_response.event_id,
+        "event_type": webhook_response.event_type,
+        "session_id": webhook_response.session_id,
+        "payment_status": webhook_response.payment_status,
+        "metadata": webhook_response.metadata,
+        "raw": body.decode("utf-8", errors="replace")
+    }, job_id=f"stripe:{webhook_response.event_id}")
+    
+    return {"success": True}
 
 # ==================== ADMIN ====================
 
@@ -2149,25 +4329,84 @@ async def get_admin_stats(current_user: User = Depends(get_current_user)):
         "total_instructors": total_instructors
     }
 
+@api_router.get("/admin/password-hash-stats")
+async def get_password_hash_stats(current_user: User = Depends(get_current_user)):
+    """bcrypt pool saturation, queue wait and hash time for this worker"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access this")
+    return password_hash_pool.stats()
+
+@api_router.post("/admin/users/{user_id}/revoke-sessions")
+async def revoke_user_sessions(user_id: str, current_user: User = Depends(get_current_user)):
+    """Force sign-out of a user on every device"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can revoke sessions")
+    await db.user_sessions.delete_many({"user_id": user_id})
+    await session_cache.invalidate_user(user_id)
+    await token_revocations.revoke_user(user_id)
+    return {"success": True}
+
+@api_router.get("/admin/cache-stats")
+async def get_cache_stats(current_user: User = Depends(get_current_user)):
+    """In-process cache counters (hits/misses/entries) for this worker"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access this")
+    return {
+        "session_cache": session_cache.stats(),
+        "catalog_cache": catalog_cache.stats(),
+        "location_occupancy": location_occupancy.stats(),
+        "scheduling_constraints": scheduling_constraints.stats(),
+        "token_revocations": token_revocations.stats()
+    }
+
+@api_router.get("/admin/jobs")
+async def get_job_stats(current_user: User = Depends(get_current_user)):
+    """Job counts by type and status, plus the most recent dead jobs"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access this")
+    counts = await db.jobs.aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}
+    ]).to_list(None)
+    dead = await db.jobs.find({"status": "dead"}, {"_id": 0}).sort("dead_at", -1).limit(20).to_list(20)
+    return {
+        "counts": [{"type": row["_id"]["type"], "status": row["_id"]["status"], "count": row["count"]} for row in counts],
+        "dead": dead,
+        "in_app_workers": [{"name": worker.name, "processed": worker.processed, "failed": worker.failed} for worker, _ in in_app_job_workers]
+    }
+
+@api_router.post("/admin/jobs/{job_id}/retry")
+async def retry_job(job_id: str, current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access this")
+    result = await db.jobs.update_one(
+        {"id": job_id, "status": "dead"},
+        {"$set": {"status": "queued", "attempts": 0, "run_at": datetime.now(timezone.utc)}, "$unset": {"dead_at": ""}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Dead job not found")
+    return {"success": True}
+
+@api_router.post("/admin/courses/{course_id}/repair-seats")
+async def repair_course_seats(course_id: str, current_user: User = Depends(get_current_user)):
+    """Queue a recount of a course's booked_seats counter"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admins can access this")
+    job_id = await enqueue_job("courses.repair_seats", {"course_id": course_id})
+    return {"success": True, "job_id": job_id}
+
 @api_router.get("/admin/schools", response_model=List[School])
-async def get_all_schools_admin(current_user: User = Depends(get_current_user)):
+async def get_all_schools_admin(response: Response, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access this")
-    schools = await db.schools.find({}, {"_id": 0}).to_list(1000)
-    for school in schools:
-        if isinstance(school["created_at"], str):
-            school["created_at"] = datetime.fromisoformat(school["created_at"])
-    return schools
+    schools = await find_page(db.schools, {}, ["created_at", "id"], page, response, SCHOOL_JSON.projection)
+    return json_response(SCHOOL_JSON.dump_list(schools), response)
 
 @api_router.get("/admin/programs", response_model=List[Course])
-async def get_all_programs_admin(current_user: User = Depends(get_current_user)):
+async def get_all_programs_admin(response: Response, page: PageParams = Depends(page_params), current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Only admins can access this")
-    courses = await db.courses.find({}, {"_id": 0}).to_list(1000)
-    for course in courses:
-        if isinstance(course["created_at"], str):
-            course["created_at"] = datetime.fromisoformat(course["created_at"])
-    return courses
+    courses = await find_page(db.courses, {}, ["created_at", "id"], page, response, COURSE_JSON.projection)
+    return json_response(COURSE_JSON.dump_list(courses), response)
 
 
 app.include_router(api_router)
@@ -2177,10 +4416,16 @@ UPLOAD_DIR = Path("/app/backend/uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
 
-app.add_middleware(CORSMiddleware, allow_credentials=True, allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','), allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(CORSMiddleware, allow_credentials=True, allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','), allow_methods=["*"], allow_headers=["*"], expose_headers=["X-Next-Cursor"])
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_in_app_job_workers():
+    in_app_job_workers.extend(start_job_workers(JOB_WORKERS))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await stop_job_workers(in_app_job_workers)
     client.close()
+    password_hash_pool.shutdown()
@@ -0,0 +1,37 @@
+"""
+Standalone background job worker
+
+Runs the same job handlers as the in-app workers started by server.py, in a
+process of its own so slow jobs never compete with request handling. Start
+the web server with JOB_WORKERS=0 when using it. Stops on SIGINT/SIGTERM once
+running jobs finish; jobs still running after that are picked up by another
+worker when their lease expires.
+
+Usage:
+    python worker.py [--concurrency 4]
+"""
+import argparse
+import asyncio
+import signal
+
+from server import JOB_HANDLERS, client, start_job_workers, stop_job_workers
+
+async def run(concurrency: int):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    workers = start_job_workers(concurrency)
+    print(f"Running {concurrency} job workers for: {', '.join(sorted(JOB_HANDLERS))}")
+    await stop.wait()
+
+    print("Stopping job workers...")
+    await stop_job_workers(workers, timeout=30)
+    client.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(run(args.concurrency))
@@ -39,7 +39,7 @@ const ScheduleCreator = ({ courseId, onScheduleCreated }) => {
 
   const checkConflicts = async () => {
     try {
-      const response = await axios.post(`${API}/validate-schedule`, formData, {
+      const response = await axios.post(`${API}/validate-schedule`, { ...formData, course_id: courseId }, {
         withCredentials: true
       });
       setConflicts(response.data);
@@ -93,7 +93,8 @@ const ScheduleCreator = ({ courseId, onScheduleCreated }) => {
       }
     } catch (error) {
       console.error('Failed to create schedule:', error);
-      toast.error(error.response?.data?.detail || 'Failed to create schedule');
+      const detail = error.response?.data?.detail;
+      toast.error(detail?.message || detail || 'Failed to create schedule');
     } finally {
       setCreating(false);
     }
@@ -218,6 +219,16 @@ const ScheduleCreator = ({ courseId, onScheduleCreated }) => {
                 </ul>
               </div>
             )}
+            {conflicts.constraint_violations?.length > 0 && (
+              <div className="mb-2">
+                <p className="text-sm font-medium text-red-700">Availability / Blocked Dates:</p>
+                <ul className="text-sm text-red-600 ml-4">
+                  {conflicts.constraint_violations.map((v, idx) => (
+                    <li key={idx}>• {v.date}: {v.type === 'location_blocked' ? `location blocked (${v.reason})` : 'instructor unavailable'}</li>
+                  ))}
+                </ul>
+              </div>
+            )}
             {conflicts.instructor_conflicts.length > 0 && (
               <div>
                 <p className="text-sm font-medium text-red-700">Instructor Conflicts:</p>